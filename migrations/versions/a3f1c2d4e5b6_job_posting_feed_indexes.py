@@ -0,0 +1,32 @@
+"""job_posting feed indexes
+
+Revision ID: a3f1c2d4e5b6
+Revises: 146a935c7461
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c2d4e5b6'
+down_revision = '146a935c7461'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job_posting', schema=None) as batch_op:
+        batch_op.create_index('ix_job_posting_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_job_posting_category_created_at_id', ['category', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_job_posting_location_created_at_id', ['location', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_job_posting_company_id_created_at_id', ['company_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job_posting', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_posting_company_id_created_at_id')
+        batch_op.drop_index('ix_job_posting_location_created_at_id')
+        batch_op.drop_index('ix_job_posting_category_created_at_id')
+        batch_op.drop_index('ix_job_posting_created_at_id')
@@ -0,0 +1,92 @@
+"""index foreign keys and route lookup columns
+
+Revision ID: b7d2e9f0c1a8
+Revises: a3f1c2d4e5b6
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e9f0c1a8'
+down_revision = 'a3f1c2d4e5b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('advertisements', schema=None) as batch_op:
+        batch_op.create_index('ix_advertisements_active_created_at', ['active', 'created_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_advertisements_company_id'), ['company_id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_company_id'), ['company_id'], unique=False)
+
+    with op.batch_alter_table('connection', schema=None) as batch_op:
+        batch_op.create_index('ix_connection_connected_user_id_status_created_at', ['connected_user_id', 'status', 'created_at'], unique=False)
+        batch_op.create_index('ix_connection_user_id_connected_user_id', ['user_id', 'connected_user_id'], unique=False)
+
+    with op.batch_alter_table('favorite_connect', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_favorite_connect_favorite_user_id'), ['favorite_user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_favorite_connect_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('job_posting', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_job_posting_posted_by'), ['posted_by'], unique=False)
+
+    with op.batch_alter_table('user_images', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_images_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('user_media', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_media_company_id'), ['company_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_media_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('job_application', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_job_application_company_id'), ['company_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_job_application_job_id'), ['job_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_job_application_user_id'), ['user_id'], unique=False)
+
+    with op.batch_alter_table('job_comment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_job_comment_company_id'), ['company_id'], unique=False)
+        batch_op.create_index('ix_job_comment_job_id_parent_id_created_at_id', ['job_id', 'parent_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_job_comment_parent_id'), ['parent_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_job_comment_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job_comment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_comment_user_id'))
+        batch_op.drop_index(batch_op.f('ix_job_comment_parent_id'))
+        batch_op.drop_index('ix_job_comment_job_id_parent_id_created_at_id')
+        batch_op.drop_index(batch_op.f('ix_job_comment_company_id'))
+
+    with op.batch_alter_table('job_application', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_application_user_id'))
+        batch_op.drop_index(batch_op.f('ix_job_application_job_id'))
+        batch_op.drop_index(batch_op.f('ix_job_application_company_id'))
+
+    with op.batch_alter_table('user_media', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_media_user_id'))
+        batch_op.drop_index(batch_op.f('ix_user_media_company_id'))
+
+    with op.batch_alter_table('user_images', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_images_user_id'))
+
+    with op.batch_alter_table('job_posting', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_posting_posted_by'))
+
+    with op.batch_alter_table('favorite_connect', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_favorite_connect_user_id'))
+        batch_op.drop_index(batch_op.f('ix_favorite_connect_favorite_user_id'))
+
+    with op.batch_alter_table('connection', schema=None) as batch_op:
+        batch_op.drop_index('ix_connection_user_id_connected_user_id')
+        batch_op.drop_index('ix_connection_connected_user_id_status_created_at')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_company_id'))
+
+    with op.batch_alter_table('advertisements', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_advertisements_company_id'))
+        batch_op.drop_index('ix_advertisements_active_created_at')
@@ -0,0 +1,26 @@
+"""advertisement weight
+
+Revision ID: c4e8a1b2d3f5
+Revises: b7d2e9f0c1a8
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1b2d3f5'
+down_revision = 'b7d2e9f0c1a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('advertisements', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('weight', sa.Float(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('advertisements', schema=None) as batch_op:
+        batch_op.drop_column('weight')
@@ -0,0 +1,31 @@
+"""ad_stats
+
+Revision ID: d9a3b5c7e1f2
+Revises: c4e8a1b2d3f5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a3b5c7e1f2'
+down_revision = 'c4e8a1b2d3f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ad_stats',
+    sa.Column('ad_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('impressions', sa.Integer(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ad_id'], ['advertisements.id'], ),
+    sa.PrimaryKeyConstraint('ad_id', 'day')
+    )
+
+
+def downgrade():
+    op.drop_table('ad_stats')
@@ -0,0 +1,83 @@
+"""full-text search indexes
+
+Revision ID: f5b7c9d1e3a4
+Revises: e2c4d6f8a0b1
+Create Date: 2026-10-18 14:00:00.000000
+
+PostgreSQL gets GIN expression indexes (the expressions must match
+api/search.py exactly). SQLite gets external-content FTS5 tables kept in sync
+by triggers. Note that a later batch migration that recreates job_posting,
+company or user on SQLite drops these triggers and must recreate them.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b7c9d1e3a4'
+down_revision = 'e2c4d6f8a0b1'
+branch_labels = None
+depends_on = None
+
+
+POSTGRES_INDEXES = {
+    'ix_job_posting_search': ('job_posting',
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(category, '') || ' ' || coalesce(location, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')"),
+    'ix_company_search': ('company',
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(industry, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')"),
+    'ix_user_search': ('user',
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(city, '') || ' ' || coalesce(state, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(bio, '')), 'C')"),
+}
+
+SQLITE_FTS_TABLES = {
+    'job_posting_fts': ('job_posting', ['title', 'category', 'location', 'description']),
+    'company_fts': ('company', ['name', 'industry', 'description']),
+    'user_fts': ('user', ['name', 'city', 'state', 'bio']),
+}
+
+
+def _sqlite_fts_ddl(fts, table, columns):
+    cols = ', '.join(columns)
+    new = ', '.join('new.' + c for c in columns)
+    old = ', '.join('old.' + c for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id')",
+        f'CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f'CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f'CREATE TRIGGER {fts}_au AFTER UPDATE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name, (table, expression) in POSTGRES_INDEXES.items():
+            op.execute(f'CREATE INDEX {name} ON "{table}" USING gin (({expression}))')
+    elif dialect == 'sqlite':
+        for fts, (table, columns) in SQLITE_FTS_TABLES.items():
+            for statement in _sqlite_fts_ddl(fts, table, columns):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name in POSTGRES_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+    elif dialect == 'sqlite':
+        for fts in SQLITE_FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {fts}')
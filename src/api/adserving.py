@@ -0,0 +1,129 @@
+"""
+Server-side ad selection.
+
+The active ad list lives in the cache (see api.cache) next to a version key.
+Both are written together by each reload and expire together after
+CACHE_DEFAULT_TTL. Each worker turns the list into an alias table (Vose's
+method) once per version, so picking an ad is O(1) per impression: one
+random index plus one coin flip. Writers call ads_changed(), which drops
+both keys. With a shared Redis cache every worker sees the new version at
+once. With per-process LRU caches the other workers reload, and rebuild
+their tables, when their own keys expire, so they lag by at most one TTL.
+"""
+import math
+import random
+import threading
+import uuid
+from flask import current_app
+from api.models import db, Advertisement
+from api.projections import ad_query, ad_row
+from api.cache import get_cache, invalidate
+
+ACTIVE_ADS_CACHE_KEY = "ads:active"
+ADS_VERSION_CACHE_KEY = "ads:version"
+MAX_ADS_PER_REQUEST = 10
+
+
+class AliasTable:
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1.0 up to float error
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, rng=random):
+        i = rng.randrange(len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class AdSelector:
+    def __init__(self, version, ads):
+        self.version = version
+        self.active = ads
+        self.active_ids = frozenset(ad["id"] for ad in ads)
+        # Rows written outside create_ad (admin, SQL) may still hold inf/nan, which would poison the table
+        self.ads = [ad for ad in ads if math.isfinite(ad.get("weight", 1.0)) and ad.get("weight", 1.0) > 0]
+        self.table = AliasTable([ad.get("weight", 1.0) for ad in self.ads]) if self.ads else None
+
+    def pick(self, n, rng=random):
+        """Up to n distinct ads, each draw proportional to weight."""
+        if not self.ads:
+            return []
+        if n >= len(self.ads):
+            return rng.sample(self.ads, len(self.ads))
+        chosen = {}
+        # Duplicate draws are discarded; bound the attempts so a few heavy ads can't stall us
+        for _ in range(n * 8):
+            i = self.table.sample(rng)
+            chosen.setdefault(i, self.ads[i])
+            if len(chosen) == n:
+                break
+        return list(chosen.values())
+
+
+_selector = None
+_selector_lock = threading.Lock()
+
+
+def load_active_ads():
+    ads = ad_query(db.session).filter(Advertisement.active == db.true()).all()
+    return [ad_row(ad) for ad in ads]
+
+
+def _reload():
+    ads = load_active_ads()
+    version = uuid.uuid4().hex
+    ttl = current_app.config["CACHE_DEFAULT_TTL"]
+    cache = get_cache()
+    cache.set(ACTIVE_ADS_CACHE_KEY, ads, ttl)
+    cache.set(ADS_VERSION_CACHE_KEY, version, ttl)
+    return version, ads
+
+
+def current_selector():
+    """This worker's selector for the cached version, rebuilt when the version changes or expires."""
+    global _selector
+    cache = get_cache()
+    selector = _selector
+    if selector is not None and selector.version == cache.get(ADS_VERSION_CACHE_KEY):
+        return selector
+    with _selector_lock:
+        version = cache.get(ADS_VERSION_CACHE_KEY)
+        if _selector is None or version is None or _selector.version != version:
+            ads = cache.get(ACTIVE_ADS_CACHE_KEY) if version is not None else None
+            if ads is None:
+                version, ads = _reload()
+            _selector = AdSelector(version, ads)
+        return _selector
+
+
+def active_ads():
+    return current_selector().active
+
+
+def is_active_ad(ad_id):
+    """Set lookup in this worker's snapshot; costs one small version-key read, no list decode or SQL."""
+    return ad_id in current_selector().active_ids
+
+
+def ads_changed():
+    """Call after committing any change to Advertisement rows."""
+    invalidate(ACTIVE_ADS_CACHE_KEY, ADS_VERSION_CACHE_KEY)
+
+
+def serve_ads(n):
+    return current_selector().pick(n)
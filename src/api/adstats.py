@@ -0,0 +1,130 @@
+"""
+Buffered impression/click counters for advertisements.
+
+Each worker accumulates counts in memory keyed by (ad_id, day) and a daemon
+thread flushes them to ad_stats every AD_STATS_FLUSH_INTERVAL seconds as one
+batched upsert (sooner if the buffer grows past AD_STATS_MAX_KEYS). A crashed
+worker loses at most one interval of counts; a failed flush puts its counts
+back into the buffer for the next attempt.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from api.models import db, AdStat
+
+DEFAULT_FLUSH_INTERVAL = 10
+DEFAULT_MAX_KEYS = 5000
+
+
+class AdCounterBuffer:
+    def __init__(self, app, interval=DEFAULT_FLUSH_INTERVAL, max_keys=DEFAULT_MAX_KEYS):
+        self.app = app
+        self.interval = interval
+        self.max_keys = max_keys
+        self._counts = defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread_pid = None
+
+    def record(self, ad_id, impressions=0, clicks=0):
+        self._ensure_flusher()
+        with self._lock:
+            counts = self._counts[(ad_id, datetime.utcnow().date())]
+            counts[0] += impressions
+            counts[1] += clicks
+            full = len(self._counts) >= self.max_keys
+        if full:
+            self.flush()
+
+    def _drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(lambda: [0, 0])
+        return counts
+
+    def _restore(self, counts):
+        with self._lock:
+            for key, (impressions, clicks) in counts.items():
+                self._counts[key][0] += impressions
+                self._counts[key][1] += clicks
+
+    def flush(self):
+        with self._flush_lock:
+            counts = self._drain()
+            if not counts:
+                return 0
+            rows = [
+                {"ad_id": ad_id, "day": day, "impressions": impressions, "clicks": clicks}
+                for (ad_id, day), (impressions, clicks) in counts.items()
+            ]
+            try:
+                with self.app.app_context():
+                    upsert_ad_stats(rows)
+            except Exception as e:
+                self._restore(counts)
+                self.app.logger.warning("ad stats flush failed, will retry: %s", e)
+                return 0
+            return len(rows)
+
+    def _ensure_flusher(self):
+        # The thread must be started inside each gunicorn worker, not the pre-fork master
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="ad-stats-flusher", daemon=True).start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def upsert_ad_stats(rows):
+    """Add each row's counts onto ad_stats in a single batched statement."""
+    table = AdStat.__table__
+    dialect = db.engine.dialect.name
+    # Use a connection of our own so a flush never commits a request's session
+    with db.engine.begin() as conn:
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["ad_id", "day"],
+                set_={
+                    "impressions": table.c.impressions + stmt.excluded.impressions,
+                    "clicks": table.c.clicks + stmt.excluded.clicks,
+                }
+            )
+            conn.execute(stmt, rows)
+            return
+        for row in rows:
+            updated = conn.execute(
+                table.update()
+                .where(table.c.ad_id == row["ad_id"], table.c.day == row["day"])
+                .values(impressions=table.c.impressions + row["impressions"],
+                        clicks=table.c.clicks + row["clicks"])
+            )
+            if updated.rowcount == 0:
+                conn.execute(table.insert().values(**row))
+
+
+def setup_ad_stats(app):
+    app.config.setdefault("AD_STATS_FLUSH_INTERVAL", float(os.getenv("AD_STATS_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)))
+    app.config.setdefault("AD_STATS_MAX_KEYS", int(os.getenv("AD_STATS_MAX_KEYS", DEFAULT_MAX_KEYS)))
+    app.extensions["ad_stats"] = AdCounterBuffer(
+        app,
+        interval=app.config["AD_STATS_FLUSH_INTERVAL"],
+        max_keys=app.config["AD_STATS_MAX_KEYS"]
+    )
+
+
+def get_ad_stats():
+    return current_app.extensions["ad_stats"]
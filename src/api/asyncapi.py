@@ -0,0 +1,253 @@
+"""
+ASGI serving mode (src/asgi.py):
+
+    uvicorn asgi:application --app-dir src --workers 2
+
+The hottest read endpoints are served natively with async handlers on
+SQLAlchemy's asyncio engine (asyncpg on Postgres, aiosqlite on SQLite):
+/api/jobs, /api/companies/<id>/jobs and /api/job/<id>/comments. While a
+query is waiting on the database, the event loop serves other requests,
+so one process can hold thousands of open connections. The handlers reuse
+the sync query code through AsyncSession.run_sync, and their responses
+match the Flask views. They get a body-hash ETag (If-None-Match -> 304),
+but not the validators that let the Flask views skip rendering (api/httpcache.py).
+
+/api/events/stream (api/events.py) is also native here. Each open stream
+is a coroutine waiting on a queue, not a pinned thread.
+
+Every other route is passed to the unchanged Flask app. It runs on a
+thread pool (ASGI_WSGI_THREADS), so it behaves as under gunicorn's
+threaded workers. Compare both modes with `flask benchmark-http`.
+"""
+import asyncio
+import os
+import re
+import time
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from werkzeug.http import generate_etag, parse_etags, quote_etag
+from flask_jwt_extended import decode_token
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from api.comments import load_comment_tree, DEFAULT_MAX_DEPTH, MAX_DEPTH_LIMIT
+from api.dbpool import async_connect_args, engine_options
+from api.events import KEEPALIVE_INTERVAL, RETRY_MS
+from api.metrics import LATENCY, REQUESTS
+from api.models import JobPosting
+from api.projections import JOB_COLUMNS, job_row
+from api.pagination import keyset_page, clamp_page_size
+from api.revocation import get_revocation_index
+from api.utils import APIException
+
+DEFAULT_WSGI_THREADS = 16
+
+
+def async_database_url(url):
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+# ----- NATIVE ASYNC HANDLERS -----
+# Each takes (session, params, query) and returns (payload, status).
+
+async def get_jobs(session, params, query):
+    category, location = query.get("category"), query.get("location")
+    company_id = query.get("company_id")
+    limit = clamp_page_size(query.get("limit", 20))
+
+    def load(sync_session):
+        jobs_query = sync_session.query(*JOB_COLUMNS)
+        if category:
+            jobs_query = jobs_query.filter(JobPosting.category == category)
+        if location:
+            jobs_query = jobs_query.filter(JobPosting.location == location)
+        if company_id and company_id.lstrip("-").isdigit():
+            jobs_query = jobs_query.filter(JobPosting.company_id == int(company_id))
+        jobs, next_cursor = keyset_page(jobs_query, JobPosting.created_at, JobPosting.id,
+                                        cursor=query.get("cursor"), limit=limit)
+        return {"jobs": [job_row(job) for job in jobs], "next_cursor": next_cursor}
+
+    return await session.run_sync(load), 200
+
+
+async def get_company_jobs(session, params, query):
+    def load(sync_session):
+        jobs = sync_session.query(*JOB_COLUMNS).filter(JobPosting.company_id == params["company_id"]).all()
+        return [job_row(job) for job in jobs]
+
+    return await session.run_sync(load), 200
+
+
+async def get_job_comments(session, params, query):
+    job_id = params["job_id"]
+    try:
+        depth = int(query.get("depth", DEFAULT_MAX_DEPTH))
+    except ValueError:
+        depth = DEFAULT_MAX_DEPTH
+    limit = clamp_page_size(query.get("limit", 20))
+
+    def load(sync_session):
+        if not sync_session.query(JobPosting.id).filter_by(id=job_id).first():
+            return {"error": "Job not found"}, 404
+        comments, next_cursor = load_comment_tree(job_id, cursor=query.get("cursor"), limit=limit,
+                                                  max_depth=max(1, min(depth, MAX_DEPTH_LIMIT)),
+                                                  session=sync_session)
+        return {"comments": comments, "next_cursor": next_cursor}, 200
+
+    return await session.run_sync(load)
+
+
+EVENT_STREAM = re.compile(r"^/api/events/stream/?$")
+
+ROUTES = [
+    ("GET", re.compile(r"^/api/jobs/?$"), get_jobs, "api.get_jobs"),
+    ("GET", re.compile(r"^/api/companies/(?P<company_id>\d+)/jobs/?$"), get_company_jobs, "api.get_company_jobs"),
+    ("GET", re.compile(r"^/api/job/(?P<job_id>\d+)/comments/?$"), get_job_comments, "api.get_job_comments"),
+]
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.fallback = WSGIMiddleware(flask_app, workers=int(os.getenv("ASGI_WSGI_THREADS", DEFAULT_WSGI_THREADS)))
+        self.engine = None
+        self.sessions = None
+
+    def start(self):
+        url = self.flask_app.config["SQLALCHEMY_DATABASE_URI"]
+        options = engine_options(url)
+        options.pop("connect_args", None)  # psycopg2-only settings
+        self.engine = create_async_engine(async_database_url(url), connect_args=async_connect_args(), **options)
+        self.sessions = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def stop(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http":
+            if scope["method"] == "GET" and EVENT_STREAM.match(scope["path"]):
+                return await self.stream_events(scope, receive, send)
+            for method, pattern, handler, endpoint in ROUTES:
+                match = pattern.match(scope["path"])
+                if match and scope["method"] in (method, "HEAD"):
+                    return await self.handle(scope, send, handler, endpoint, match)
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def handle(self, scope, send, handler, endpoint, match):
+        if self.engine is None:
+            self.start()  # servers without lifespan support
+        started = time.perf_counter()
+        params = {key: int(value) for key, value in match.groupdict().items()}
+        query = {key: values[-1] for key, values in parse_qs(scope["query_string"].decode("latin-1")).items()}
+        try:
+            async with self.sessions() as session:
+                payload, status = await handler(session, params, query)
+        except APIException as e:
+            payload, status = e.to_dict(), e.status_code
+
+        # Same encoder and formatting as jsonify in the Flask views
+        response = self.flask_app.json.response(payload)
+        body = response.get_data()
+        headers = [(b"content-type", response.mimetype.encode())]
+        if status == 200 and self.flask_app.config["HTTP_ETAGS"]:
+            etag = generate_etag(body)
+            request_headers = dict(scope["headers"])
+            headers.append((b"etag", quote_etag(etag, weak=True).encode()))
+            headers.append((b"cache-control", b"private, no-cache" if b"authorization" in request_headers else b"no-cache"))
+            if parse_etags(request_headers.get(b"if-none-match", b"").decode("latin-1")).contains_weak(etag):
+                status, body = 304, b""
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+        LATENCY.labels(endpoint, scope["method"]).observe(time.perf_counter() - started)
+        REQUESTS.labels(endpoint, scope["method"], str(status)).inc()
+
+    def _authenticate(self, scope):
+        """User id from an access token in the Authorization header or ?jwt=, else None."""
+        headers = dict(scope["headers"])
+        token = None
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.startswith("Bearer "):
+            token = authorization[len("Bearer "):]
+        else:
+            token = parse_qs(scope["query_string"].decode("latin-1")).get("jwt", [None])[-1]
+        if not token:
+            return None
+        with self.flask_app.app_context():
+            try:
+                decoded = decode_token(token)
+            except Exception:
+                return None
+            if decoded.get("type") != "access" or get_revocation_index().is_revoked(decoded["jti"]):
+                return None
+            return int(decoded[self.flask_app.config.get("JWT_IDENTITY_CLAIM", "sub")])
+
+    async def _send_json(self, send, payload, status):
+        body = self.flask_app.json.response(payload).get_data()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def stream_events(self, scope, receive, send):
+        user_id = await asyncio.to_thread(self._authenticate, scope)
+        if user_id is None:
+            return await self._send_json(send, {"msg": "Missing or invalid token"}, 401)
+
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+
+        def deliver(message):
+            # Called from publishing threads (Flask views, Redis listener)
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        async def wait_for_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        broker = self.flask_app.extensions["events"]
+        broker.subscribe(user_id, deliver)
+        disconnected = asyncio.ensure_future(wait_for_disconnect())
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            chunk = "retry: %d\n\n" % RETRY_MS
+            while True:
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+                getter = asyncio.ensure_future(messages.get())
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=KEEPALIVE_INTERVAL,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                if disconnected in done:
+                    return
+                chunk = getter.result() if getter in done else ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(user_id, deliver)
+            disconnected.cancel()
+
+
+def create_asgi_app(flask_app):
+    return AsyncAPI(flask_app)
@@ -0,0 +1,542 @@
+"""
+Endpoint benchmark (`flask benchmark`).
+
+Replays a weighted, read-heavy mix of API requests through the Flask test
+client against whatever DATABASE_URL points at, after `flask seed`.
+Records per-endpoint latency percentiles, throughput and SQL statement
+counts. Results can be saved as a JSON baseline, and later runs are
+compared with it: an endpoint regresses if its p95 latency grows past the
+tolerance or it issues more queries than it did in the baseline.
+
+Authenticated requests carry tokens from POST /api/login for a pool of
+seeded users (SEED_PASSWORD). Writes run as flows: steps that feed on the
+previous response, each timed under its own name.
+- signup, login, a connection request, its acceptance, favorites and
+  the notifications it produced
+- a comment and a reply to it
+- a resume upload (create, one chunk, commit)
+Flows add rows and files, so run them against a disposable database. A
+failed step ends its flow. Any 5xx response fails the command.
+Not driven: admin-only writes, file and video serving, the event stream,
+and /refresh and /logout, which need a refresh token /login doesn't issue.
+
+The test client skips the network and the WSGI server, so numbers measure
+the app and the database only. Compare runs on the same machine and data.
+
+run_http_benchmark() drives the GET part of the same mix over real HTTP
+keep-alive connections against a running server, to compare serving modes:
+
+    gunicorn wsgi --chdir src/ -w 2 -b :8000
+    uvicorn asgi:application --app-dir src/ --workers 2 --port 8001
+    flask benchmark-http --url http://127.0.0.1:8000 --url http://127.0.0.1:8001 --concurrency 200
+
+run_serialization_benchmark() times the two halves of a list response for
+the jobs and ads lists, reported as ms per 10k rows:
+- loading: ORM objects + serialize() vs column projections (api/projections.py)
+- encoding: the stdlib JSON provider vs orjson (api/fastjson.py)
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event, func
+from api.fastjson import FastJSONProvider, fast_json_available
+from api.loadplans import ADVERTISEMENT_SERIALIZE
+from api.models import db, User, Company, JobPosting, Advertisement
+from api.projections import JOB_COLUMNS, ad_query, ad_row, job_row
+from api.replicas import all_engines
+from api.seed import SEED_EMAIL, SEED_PASSWORD
+
+WARMUP_REQUESTS = 50
+SAMPLE_IDS = 1000
+ROWS_PER_REPORT = 10000
+ACTORS = 20  # seeded users logged in up front; authenticated scenarios act as one of them
+RESUME_BYTES = 64 * 1024
+
+# One request. auth is None, a user id from the logged-in pool, or a token string.
+Step = namedtuple("Step", "name method path auth json data headers", defaults=(None, None, None, None))
+
+
+def _ad_report(ids, rng):
+    # The report is only visible to the company's own employees
+    user_id, company_id = rng.choice(ids["employee"])
+    return "/api/companies/%d/ads/report" % company_id, user_id
+
+
+def _user_connections(ids, rng):
+    # A user's connection list is visible to that user (and their connections)
+    user_id = rng.choice(ids["actor"])
+    return "/api/users/%d/connections" % user_id, user_id
+
+
+def _mutual(ids, rng):
+    # Only one of the pair may ask
+    user_id = rng.choice(ids["actor"])
+    return "/api/users/%d/mutual/%d" % (user_id, rng.choice(ids["user"])), user_id
+
+
+def _signup_flow(ids, rng):
+    """A new member signs up, logs in and asks a member to connect; the member accepts and both check in."""
+    email = "bench_%s@example.com" % uuid.UUID(int=rng.getrandbits(128)).hex
+    member = rng.choice(ids["actor"])
+
+    def steps():
+        signup = yield Step("signup", "POST", "/api/signup",
+                            json={"email": email, "password": SEED_PASSWORD, "full_name": "Benchmark User"})
+        user_id = signup["user"]["id"]
+        login = yield Step("login", "POST", "/api/login", json={"email": email, "password": SEED_PASSWORD})
+        token = login["access_token"]
+        yield Step("connection_add", "POST", "/api/connections/%d/add" % member, token)
+        pending = yield Step("pending_requests", "GET", "/api/users/pending_requests", member)
+        connection_id = next(request["id"] for request in pending if request["user_id"] == user_id)
+        yield Step("connection_accept", "PATCH", "/api/users/connection/%d" % connection_id, member,
+                   json={"status": "connected"})
+        yield Step("favorite_add", "POST", "/api/favorite-connects/%d/add" % user_id, json={"favorite_user_id": member})
+        yield Step("favorites", "GET", "/api/users/favorites", token)
+        yield Step("notifications", "GET", "/api/notifications", token)
+        yield Step("notifications_read", "POST", "/api/notifications/read", token, json={"all": True})
+    return steps()
+
+
+def _comment_flow(ids, rng):
+    """A member comments on a job and another replies, which notifies the first."""
+    job_id, author, replier = rng.choice(ids["job"]), rng.choice(ids["actor"]), rng.choice(ids["actor"])
+
+    def steps():
+        comment = yield Step("comment", "POST", "/api/job/%d/comment" % job_id, author,
+                             json={"content": "Is this role still open?"})
+        yield Step("comment_reply", "POST", "/api/job/%d/comment" % job_id, replier,
+                   json={"content": "It is, apply soon.", "parent_id": comment["id"]})
+        yield Step("unread_count", "GET", "/api/notifications/unread-count", author)
+    return steps()
+
+
+def _upload_flow(ids, rng):
+    """A member uploads a resume for a job in one chunk and commits it."""
+    user_id, job_id = rng.choice(ids["actor"]), rng.choice(ids["job"])
+    body = rng.randbytes(RESUME_BYTES)
+
+    def steps():
+        upload = yield Step("upload_create", "POST", "/api/uploads", user_id,
+                            json={"kind": "resume", "job_id": job_id, "file_name": "resume.pdf", "size": len(body)})
+        path = "/api/uploads/" + upload["upload_id"]
+        yield Step("upload_chunk", "PUT", path, user_id, data=body,
+                   headers={"Upload-Offset": "0", "X-Chunk-SHA256": hashlib.sha256(body).hexdigest()})
+        yield Step("upload_commit", "POST", path + "/commit", user_id)
+    return steps()
+
+
+# name, weight, method, builder(ids, rng). A builder returns a path, or (path, user_id) to send that user's
+# token. With method None it is a flow: a generator of Steps that is sent each step's JSON response.
+SCENARIOS = [
+    ("jobs", 20, "GET", lambda ids, rng: "/api/jobs"),
+    ("jobs_by_category", 8, "GET", lambda ids, rng: "/api/jobs?category=" + rng.choice(["Budtender", "Grower", "Trimmer"])),
+    ("job_comments", 10, "GET", lambda ids, rng: "/api/job/%d/comments" % rng.choice(ids["job"])),
+    ("company_jobs", 6, "GET", lambda ids, rng: "/api/companies/%d/jobs" % rng.choice(ids["company"])),
+    ("users", 6, "GET", lambda ids, rng: "/api/users"),
+    ("companies", 6, "GET", lambda ids, rng: "/api/companies"),
+    ("company", 6, "GET", lambda ids, rng: "/api/companies/%d" % rng.choice(ids["company"])),
+    ("search", 8, "GET", lambda ids, rng: "/api/search?type=jobs&q=" + rng.choice(["budtender", "grower+denver", "compliance"])),
+    ("user_connections", 6, "GET", _user_connections),
+    ("mutual_connections", 3, "GET", _mutual),
+    ("suggestions", 3, "GET", lambda ids, rng: ("/api/users/suggestions", rng.choice(ids["actor"]))),
+    ("ads", 6, "GET", lambda ids, rng: "/api/ads"),
+    ("ads_serve", 8, "GET", lambda ids, rng: "/api/ads/serve?n=3"),
+    ("ad_impression", 3, "POST", lambda ids, rng: "/api/ads/%d/impression" % rng.choice(ids["ad"])),
+    ("ad_report", 1, "GET", _ad_report),
+    ("signup_flow", 1, None, _signup_flow),
+    ("comment_flow", 3, None, _comment_flow),
+    ("upload_flow", 1, None, _upload_flow),
+]
+
+
+def sample_ids(limit=SAMPLE_IDS):
+    ids = {}
+    for name, query in (("user", db.session.query(User.id)), ("company", db.session.query(Company.id)),
+                        ("job", db.session.query(JobPosting.id)),
+                        ("ad", db.session.query(Advertisement.id).filter(Advertisement.active == db.true()))):
+        ids[name] = [row[0] for row in query.order_by(func.random()).limit(limit)] or [1]
+    seeded = db.session.query(User.id, User.company_id, User.email).filter(User.email.like(SEED_EMAIL.replace("%d", "%")))
+    actors = seeded.order_by(func.random()).limit(ACTORS).all()
+    employees = seeded.filter(User.company_id.isnot(None)).order_by(func.random()).limit(ACTORS).all()
+    ids["actor"] = [row.id for row in actors] or [1]
+    ids["employee"] = [(row.id, row.company_id) for row in employees] or [(1, 1)]
+    ids["email"] = {row.id: row.email for row in actors + employees}
+    db.session.remove()
+    return ids
+
+
+def login_tokens(emails, post):
+    """Log every user in emails ({user_id: email}) in through /api/login; post(path, payload) -> (status, json)."""
+    tokens = {}
+    for user_id, email in emails.items():
+        status, body = post("/api/login", {"email": email, "password": SEED_PASSWORD})
+        if status != 200 or not body or "access_token" not in body:
+            raise RuntimeError("login as %s failed with HTTP %d: %r" % (email, status, body))
+        tokens[user_id] = body["access_token"]
+    return tokens
+
+
+def _step(name, method, built):
+    if isinstance(built, str):
+        return Step(name, method, built)
+    path, user_id = built
+    return Step(name, method, path, user_id)
+
+
+def _single(step):
+    yield step
+
+
+def _headers(step, tokens):
+    headers = dict(step.headers or {})
+    if step.auth is not None:
+        headers["Authorization"] = "Bearer " + (step.auth if isinstance(step.auth, str) else tokens[step.auth])
+    return headers
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class _QueryCounter:
+    """Counts statements per thread, so concurrent requests don't mix their counts."""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.local = threading.local()
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            event.remove(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.local.count = getattr(self.local, "count", 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self.local, "count", 0)
+
+
+def run_benchmark(app, requests=2000, concurrency=1, seed=0):
+    rng = random.Random(seed)
+    ids = sample_ids()
+    names = [s[0] for s in SCENARIOS]
+    weights = [s[1] for s in SCENARIOS]
+    by_name = {s[0]: s for s in SCENARIOS}
+    plan = []
+    for name in rng.choices(names, weights=weights, k=WARMUP_REQUESTS + requests):
+        _, _, method, build = by_name[name]
+        plan.append(build(ids, rng) if method is None else _step(name, method, build(ids, rng)))
+    warmup, plan = plan[:WARMUP_REQUESTS], plan[WARMUP_REQUESTS:]
+
+    def post(path, payload):
+        response = app.test_client().post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+    tokens = login_tokens(ids["email"], post)
+    samples = {}
+    counter = _QueryCounter(all_engines(db.engine))
+    clients = threading.local()
+
+    def call(item):
+        """Run a Step or a flow; returns [(name, seconds, queries, status)] for every request made."""
+        client = getattr(clients, "client", None)
+        if client is None:
+            client = clients.client = app.test_client()
+        flow = _single(item) if isinstance(item, Step) else item
+        rows, reply = [], None
+        try:
+            while True:
+                step = flow.send(reply)
+                counter.reset()
+                started = time.perf_counter()
+                response = client.open(step.path, method=step.method, headers=_headers(step, tokens),
+                                       json=step.json, data=step.data)
+                elapsed = time.perf_counter() - started
+                reply = response.get_json(silent=True)
+                response.close()
+                rows.append((step.name, elapsed, counter.count, response.status_code))
+                if response.status_code >= 400:
+                    break  # the rest of a flow depends on this step
+        except StopIteration:
+            pass
+        finally:
+            flow.close()
+        return rows
+
+    with counter:
+        for item in warmup:
+            call(item)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for rows in pool.map(call, plan):
+                for name, elapsed, queries, status in rows:
+                    samples.setdefault(name, []).append((elapsed, queries, status))
+        wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name, rows in samples.items():
+        if not rows:
+            continue
+        latencies = sorted(r[0] * 1000 for r in rows)
+        queries = [r[1] for r in rows]
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r[2] >= 400),
+            "server_errors": sum(1 for r in rows if r[2] >= 500),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries_mean": round(sum(queries) / len(queries), 2),
+            "queries_max": max(queries),
+        }
+    return {
+        "requests": sum(len(rows) for rows in samples.values()),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(sum(len(rows) for rows in samples.values()) / wall, 1) if wall else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def server_errors(result):
+    """["name: N 5xx responses"] for every endpoint that answered with a server error."""
+    return ["%s: %d 5xx responses" % (name, row["server_errors"])
+            for name, row in sorted(result["endpoints"].items()) if row.get("server_errors")]
+
+
+def compare(result, baseline, latency_tolerance=0.2, min_latency_delta_ms=2.0):
+    """List of human-readable regressions of result against baseline.
+
+    Latency is only compared when both runs used the same concurrency.
+    """
+    regressions = []
+    same_load = result["concurrency"] == baseline.get("concurrency")
+    for name, current in result["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None:
+            continue
+        limit = max(before["p95_ms"] * (1 + latency_tolerance), before["p95_ms"] + min_latency_delta_ms)
+        if same_load and current["p95_ms"] > limit:
+            regressions.append("%s: p95 %.1fms > %.1fms (baseline %.1fms)" % (name, current["p95_ms"], limit, before["p95_ms"]))
+        if current["queries_max"] > before["queries_max"]:
+            regressions.append("%s: up to %d queries (baseline %d)" % (name, current["queries_max"], before["queries_max"]))
+        if current["errors"] > before["errors"]:
+            regressions.append("%s: %d error responses (baseline %d)" % (name, current["errors"], before["errors"]))
+    return regressions
+
+
+def format_report(result, baseline=None):
+    lines = ["%-20s %6s %6s %9s %9s %9s %8s %9s" % ("endpoint", "reqs", "errors", "p50 ms", "p95 ms", "p99 ms", "queries", "base p95")]
+    for name, row in sorted(result["endpoints"].items()):
+        before = (baseline or {}).get("endpoints", {}).get(name)
+        lines.append("%-20s %6d %6d %9.2f %9.2f %9.2f %8.1f %9s" % (
+            name, row["requests"], row["errors"], row["p50_ms"], row["p95_ms"], row["p99_ms"], row["queries_mean"],
+            "%.2f" % before["p95_ms"] if before else "-"))
+    lines.append("%d requests in %.2fs (%.1f req/s, concurrency %d)" % (
+        result["requests"], result["seconds"], result["throughput_rps"], result["concurrency"]))
+    return "\n".join(lines)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(result, path):
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response; returns (status, connection reusable)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    version, status = status_line.split(b" ", 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return int(status), False
+    return int(status), version == b"HTTP/1.1" and headers.get("connection") != "close"
+
+
+async def _http_client(host, port, urls, deadline, results):
+    reader = writer = None
+    index = 0
+    while time.perf_counter() < deadline:
+        name, path, headers = urls[index % len(urls)]
+        index += 1
+        started = time.perf_counter()
+        reusable = False
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            header_lines = "".join("%s: %s\r\n" % item for item in headers.items())
+            writer.write(("GET %s HTTP/1.1\r\nHost: %s\r\n%s\r\n" % (path, host, header_lines)).encode())
+            status, reusable = await _read_response(reader)
+        except (OSError, ValueError, asyncio.IncompleteReadError):
+            status = 0
+        results.append((name, time.perf_counter() - started, status))
+        if not reusable and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+def run_http_benchmark(base_url, concurrency=100, duration=10.0, seed=0):
+    """Hammer a running server with concurrency keep-alive clients for duration seconds."""
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    rng = random.Random(seed)
+    ids = sample_ids()
+    scenarios = [s for s in SCENARIOS if s[2] == "GET"]
+    names = [s[0] for s in scenarios]
+    weights = [s[1] for s in scenarios]
+    by_name = {s[0]: s for s in scenarios}
+
+    def post(path, payload):
+        request = urllib.request.Request(base_url.rstrip("/") + path, data=json.dumps(payload).encode(),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, None
+
+    tokens = login_tokens(ids["email"], post)
+    urls = []
+    for name in rng.choices(names, weights=weights, k=1000):
+        step = _step(name, "GET", by_name[name][3](ids, rng))
+        urls.append((name, step.path, _headers(step, tokens)))
+
+    async def main():
+        results = []
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            _http_client(host, port, urls[i % len(urls):] + urls[:i % len(urls)], deadline, results)
+            for i in range(concurrency)
+        ))
+        return results
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    wall = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        rows = [r for r in results if r[0] == name]
+        if not rows:
+            continue
+        latencies = sorted(r[1] * 1000 for r in rows)
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for r in rows if r[2] == 0 or r[2] >= 400),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "queries_mean": 0.0,
+            "queries_max": 0,
+        }
+    return {
+        "url": base_url,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 1) if wall else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def _best_of(fn, repeat):
+    """Fastest of repeat calls in seconds, and the last result. The session is reset between calls."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        db.session.remove()  # no identity map carried over to the next ORM load
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_serialization_benchmark(app, rows=ROWS_PER_REPORT, repeat=5):
+    datasets = [
+        ("jobs",
+         lambda: [job.serialize() for job in JobPosting.query.order_by(JobPosting.id).limit(rows)],
+         lambda: [job_row(row) for row in db.session.query(*JOB_COLUMNS).order_by(JobPosting.id).limit(rows)]),
+        ("ads",
+         lambda: [ad.serialize() for ad in
+                  Advertisement.query.options(*ADVERTISEMENT_SERIALIZE).order_by(Advertisement.id).limit(rows)],
+         lambda: [ad_row(row) for row in ad_query(db.session).order_by(Advertisement.id).limit(rows)]),
+    ]
+    encoders = [("stdlib json", DefaultJSONProvider(app))]
+    if fast_json_available():
+        encoders.append(("orjson", FastJSONProvider(app)))
+
+    results = []
+    with app.app_context():
+        for name, load_orm, load_projection in datasets:
+            orm_seconds, orm_payload = _best_of(load_orm, repeat)
+            projection_seconds, payload = _best_of(load_projection, repeat)
+            count = len(payload)
+            scale = 1000.0 * ROWS_PER_REPORT / count if count else 0.0
+            timings = [("load: ORM + serialize()", orm_seconds * scale),
+                       ("load: column projection", projection_seconds * scale)]
+            for label, provider in encoders:
+                seconds, _ = _best_of(lambda: provider.response(payload).get_data(), repeat)
+                timings.append(("encode: " + label, seconds * scale))
+            results.append({
+                "name": name,
+                "rows": count,
+                "matches": orm_payload == payload,
+                "timings": timings,
+            })
+    return results
+
+
+def format_serialization_report(results):
+    lines = []
+    for result in results:
+        lines.append("%s: %d rows, projection output %s serialize()" % (
+            result["name"], result["rows"], "matches" if result["matches"] else "DIFFERS FROM"))
+        for label, ms in result["timings"]:
+            lines.append("  %-28s %9.2f ms per %dk rows" % (label, ms, ROWS_PER_REPORT // 1000))
+    return "\n".join(lines)
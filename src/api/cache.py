@@ -0,0 +1,139 @@
+"""
+Read-through cache with a pluggable backend.
+
+CACHE_URL unset   -> per-process LRU (each gunicorn worker has its own copy;
+                     cross-worker staleness is bounded by the TTL)
+CACHE_URL=redis://...  -> shared Redis (or any Redis-protocol server), so
+                     invalidation from one worker is seen by all of them
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class LRUCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        """Values for keys in order, None for misses."""
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        self.set_many({key: value}, ttl)
+
+    def set_many(self, mapping, ttl=DEFAULT_TTL):
+        with self._lock:
+            expires_at = time.monotonic() + ttl
+            for key, value in mapping.items():
+                self._data[key] = (value, expires_at)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, amount=1):
+        """Add amount to a cached integer, keeping its expiry. Returns None if key isn't cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            value = entry[0] + amount
+            self._data[key] = (value, entry[1])
+            return value
+
+
+class RedisCache:
+    """Values are stored as JSON, so only cache serialized (dict/list) data."""
+
+    # INCRBY would create a missing key; only adjust counters that are already cached
+    INCR_IF_EXISTS = "if redis.call('exists', KEYS[1]) == 1 then return redis.call('incrby', KEYS[1], ARGV[1]) end"
+
+    def __init__(self, url, prefix="greenbizlink:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def get_many(self, keys):
+        """One MGET round trip for all keys."""
+        if not keys:
+            return []
+        return [json.loads(raw) if raw is not None else None
+                for raw in self.client.mget([self.prefix + key for key in keys])]
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def set_many(self, mapping, ttl=DEFAULT_TTL):
+        pipeline = self.client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(self.prefix + key, json.dumps(value), ex=ttl)
+        pipeline.execute()
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def incr(self, key, amount=1):
+        return self.client.eval(self.INCR_IF_EXISTS, 1, self.prefix + key, amount)
+
+
+def setup_cache(app):
+    app.config.setdefault("CACHE_URL", os.getenv("CACHE_URL"))
+    app.config.setdefault("CACHE_DEFAULT_TTL", int(os.getenv("CACHE_DEFAULT_TTL", DEFAULT_TTL)))
+    app.config.setdefault("CACHE_MAX_ENTRIES", int(os.getenv("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)))
+
+    url = app.config["CACHE_URL"]
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        app.extensions["cache"] = RedisCache(url)
+    else:
+        app.extensions["cache"] = LRUCache(app.config["CACHE_MAX_ENTRIES"])
+
+
+def get_cache():
+    return current_app.extensions["cache"]
+
+
+def get_or_set(key, loader, ttl=None):
+    """Return the cached value for key, calling loader() and caching its result on a miss."""
+    cache = get_cache()
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, ttl or current_app.config["CACHE_DEFAULT_TTL"])
+    return value
+
+
+def invalidate(*keys):
+    get_cache().delete(*keys)
@@ -1,6 +1,18 @@
 
 import click
-from api.models import db, User
+from flask import url_for
+from werkzeug.security import generate_password_hash
+from api.models import db, User, JobPosting
+from api.benchmark import (run_benchmark, run_http_benchmark, run_serialization_benchmark, compare, format_report,
+                           format_serialization_report, load_baseline, save_baseline, server_errors)
+from api.loadplans import QUERY_BUDGETS
+from api.queryplans import find_seq_scans
+from api.replicas import all_engines
+from api.revocation import purge_expired_tokens
+from api.seed import seed_database
+from api.tasks import run_workers
+from api.uploads import purge_stale_sessions
+from api.utils import count_queries
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -18,17 +30,192 @@ def setup_commands(app):
     @click.argument("count") # argument of out command
     def insert_test_users(count):
         print("Creating test users")
+        password_hash = generate_password_hash("123456")
+        users = []
         for x in range(1, int(count) + 1):
-            user = User()
-            user.email = "test_user" + str(x) + "@test.com"
-            user.password = "123456"
-            user.is_active = True
-            db.session.add(user)
-            db.session.commit()
+            users.append(User(
+                name="Test User " + str(x),
+                email="test_user" + str(x) + "@test.com",
+                password_hash=password_hash,
+                is_verified=True
+            ))
+        db.session.add_all(users)
+        db.session.commit()
+        for user in users:
             print("User: ", user.email, " created.")
 
         print("All test users created")
 
     @app.cli.command("insert-test-data")
     def insert_test_data():
-        pass
\ No newline at end of file
+        pass
+
+    """
+    Generate a large, realistic dataset for load testing (see api/seed.py), e.g.
+    $ flask seed --users 1000000 --seed 7
+    The same --seed always produces the same rows. Seeded users' password is "password123".
+    """
+    @app.cli.command("seed")
+    @click.option("--users", default=1000, help="Number of users")
+    @click.option("--companies", type=int, default=None, help="Number of companies (default: users / 20)")
+    @click.option("--connections-per-user", default=10)
+    @click.option("--favorites-per-user", default=2)
+    @click.option("--jobs-per-company", default=5)
+    @click.option("--comments-per-job", default=4)
+    @click.option("--applications-per-job", default=3)
+    @click.option("--ads-per-company", default=1)
+    @click.option("--seed", "seed_value", default=42, help="Random seed")
+    @click.option("--batch-size", default=5000, help="Rows per INSERT/COPY batch")
+    def seed(seed_value, **scale):
+        print("Seeding database (seed", str(seed_value) + ")")
+        seed_database(seed=seed_value, **scale)
+        print("Done")
+
+    """
+    Run every endpoint listed in api.loadplans.QUERY_BUDGETS against the current
+    database and fail if any of them issues more SQL statements than its budget.
+    Seed some data first, otherwise empty pages trivially pass.
+    $ flask check-query-budgets
+    """
+    @app.cli.command("check-query-budgets")
+    def check_query_budgets():
+        job = JobPosting.query.order_by(JobPosting.id).first()
+        url_args = {"job_id": job.id if job else 1}
+        db.session.remove()
+
+        client = app.test_client()
+        failures = 0
+        for endpoint, budget in QUERY_BUDGETS.items():
+            with app.test_request_context():
+                arguments = next(app.url_map.iter_rules(endpoint)).arguments
+                url = url_for(endpoint, **{k: v for k, v in url_args.items() if k in arguments})
+            with count_queries(*all_engines(db.engine)) as statements:
+                response = client.get(url)
+            over = len(statements) > budget
+            failures += over
+            print(("FAIL" if over else "ok  "), url, response.status_code, len(statements), "queries (budget", str(budget) + ")")
+            if over:
+                for statement in statements:
+                    print("    ", " ".join(statement.split())[:200])
+
+        if failures:
+            raise click.ClickException(str(failures) + " endpoint(s) over their query budget")
+        print("All endpoints within budget")
+
+    """
+    Benchmark a weighted mix of API requests (see api/benchmark.py) and print
+    per-endpoint p50/p95/p99 latency, query counts and throughput. Exits 1 on any
+    5xx. It writes rows, so use a disposable database, seeded first:
+    $ flask benchmark --requests 5000 --save-baseline bench.json
+    $ flask benchmark --requests 5000 --baseline bench.json   # exits 1 on regressions
+    """
+    @app.cli.command("benchmark")
+    @click.option("--requests", "total", default=2000, help="Measured requests (after a short warmup)")
+    @click.option("--concurrency", default=1, help="Client threads")
+    @click.option("--seed", "seed_value", default=0, help="Random seed for the request mix")
+    @click.option("--baseline", "baseline_path", type=click.Path(exists=True, dir_okay=False), help="Compare against this result file")
+    @click.option("--save-baseline", "save_path", type=click.Path(dir_okay=False), help="Write this run's results here")
+    @click.option("--tolerance", default=0.2, help="Allowed relative p95 slowdown before flagging")
+    def benchmark(total, concurrency, seed_value, baseline_path, save_path, tolerance):
+        before = load_baseline(baseline_path) if baseline_path else None
+        result = run_benchmark(app, requests=total, concurrency=concurrency, seed=seed_value)
+        print(format_report(result, before))
+        failures = server_errors(result)
+        for failure in failures:
+            print("SERVER ERROR", failure)
+        if failures:
+            raise click.ClickException(str(len(failures)) + " endpoint(s) answered with 5xx")
+        if save_path:
+            save_baseline(result, save_path)
+            print("Baseline written to", save_path)
+        if before:
+            regressions = compare(result, before, latency_tolerance=tolerance)
+            for regression in regressions:
+                print("REGRESSION", regression)
+            if regressions:
+                raise click.ClickException(str(len(regressions)) + " regression(s) against " + baseline_path)
+            print("No regressions against", baseline_path)
+
+    """
+    Load-test running servers over HTTP, e.g. the sync (gunicorn wsgi) and
+    async (uvicorn asgi) serving modes side by side; see api/benchmark.py.
+    $ flask benchmark-http --url http://127.0.0.1:8000 --url http://127.0.0.1:8001 --concurrency 200
+    """
+    @app.cli.command("benchmark-http")
+    @click.option("--url", "urls", multiple=True, required=True, help="Server base URL; repeat to compare")
+    @click.option("--concurrency", default=100, help="Concurrent keep-alive connections")
+    @click.option("--duration", default=10.0, help="Seconds per server")
+    @click.option("--seed", "seed_value", default=0, help="Random seed for the request mix")
+    def benchmark_http(urls, concurrency, duration, seed_value):
+        results = []
+        for url in urls:
+            print("==", url)
+            result = run_http_benchmark(url, concurrency=concurrency, duration=duration, seed=seed_value)
+            print(format_report(result))
+            results.append(result)
+        if len(results) > 1:
+            print("== summary")
+            for result in results:
+                errors = sum(row["errors"] for row in result["endpoints"].values())
+                print("%-30s %9.1f req/s %6d errors" % (result["url"], result["throughput_rps"], errors))
+
+    """
+    Time loading and JSON-encoding the jobs and ads lists, per 10k rows:
+    ORM objects + serialize() vs column projections, stdlib json vs orjson.
+    $ flask benchmark-serialization --rows 10000
+    """
+    @app.cli.command("benchmark-serialization")
+    @click.option("--rows", default=10000, help="Rows to load per list (capped by what the database has)")
+    @click.option("--repeat", default=5, help="Runs per measurement; the fastest is reported")
+    def benchmark_serialization(rows, repeat):
+        results = run_serialization_benchmark(app, rows=rows, repeat=repeat)
+        print(format_serialization_report(results))
+        if not all(result["matches"] for result in results):
+            raise click.ClickException("column projections no longer match serialize()")
+
+    """
+    EXPLAIN each route's query shape (see api/queryplans.py) and fail if any of
+    them sequentially scans a table. Meaningful only on a large seeded database.
+    $ flask check-query-plans
+    """
+    @app.cli.command("check-query-plans")
+    def check_query_plans():
+        failures = 0
+        for name, sql, scans in find_seq_scans():
+            failures += bool(scans)
+            print(("FAIL" if scans else "ok  "), name, ("seq scan on " + ", ".join(scans)) if scans else "")
+            if scans:
+                print("    ", " ".join(sql.split())[:300])
+
+        if failures:
+            raise click.ClickException(str(failures) + " route query(ies) fall back to a sequential scan")
+        print("No sequential scans")
+
+    """
+    Delete token_blocklist rows for tokens that have expired anyway; run it from cron.
+    Workers drop them from their bloom filters at the next rebuild.
+    $ flask purge-token-blocklist
+    """
+    @app.cli.command("purge-token-blocklist")
+    def purge_token_blocklist():
+        print("Purged", purge_expired_tokens(), "expired blocklist entries")
+
+    """
+    Run background task workers (see api/tasks.py), e.g. $ flask run-worker --processes 4
+    Use --burst to exit once the queue is drained.
+    """
+    @app.cli.command("run-worker")
+    @click.option("--processes", default=1, help="Number of worker processes")
+    @click.option("--poll-interval", default=1.0, help="Seconds to sleep when the queue is empty")
+    @click.option("--burst", is_flag=True, help="Exit when there is nothing left to run")
+    def run_worker(processes, poll_interval, burst):
+        print("Starting", processes, "task worker(s)")
+        run_workers(app, processes=processes, poll_interval=poll_interval, burst=burst)
+
+    """
+    Remove chunked uploads abandoned for over a day, with their partial files.
+    $ flask purge-stale-uploads
+    """
+    @app.cli.command("purge-stale-uploads")
+    def purge_stale_uploads():
+        print("Removed", purge_stale_sessions(), "stale upload(s)")
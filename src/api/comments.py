@@ -0,0 +1,50 @@
+from collections import defaultdict
+from sqlalchemy import literal, select
+from api.models import db, JobComment
+from api.pagination import keyset_page
+
+DEFAULT_MAX_DEPTH = 5
+MAX_DEPTH_LIMIT = 10
+
+
+def load_comment_tree(job_id, cursor=None, limit=20, max_depth=DEFAULT_MAX_DEPTH, session=None):
+    """
+    Page of top-level comments for a job with their reply trees, in two queries:
+    one keyset page of roots, then one recursive CTE for every reply under them
+    down to max_depth. The tree is assembled in memory by parent_id.
+    Returns (serialized_roots, next_cursor). session defaults to db.session.
+    """
+    session = session or db.session
+    roots_query = session.query(JobComment).filter(
+        JobComment.job_id == job_id,
+        JobComment.parent_id.is_(None)
+    )
+    roots, next_cursor = keyset_page(roots_query, JobComment.created_at, JobComment.id, cursor=cursor, limit=limit)
+    if not roots:
+        return [], next_cursor
+
+    children_by_parent = defaultdict(list)
+    if max_depth > 1:
+        tree = select(
+            JobComment.id.label("id"),
+            literal(1).label("depth")
+        ).where(JobComment.id.in_([root.id for root in roots])).cte("comment_tree", recursive=True)
+        tree = tree.union_all(
+            select(JobComment.id, tree.c.depth + 1)
+            .where(JobComment.parent_id == tree.c.id)
+            .where(tree.c.depth < max_depth)
+        )
+        replies = (
+            session.query(JobComment)
+            .join(tree, JobComment.id == tree.c.id)
+            .filter(tree.c.depth > 1)
+            .order_by(JobComment.created_at, JobComment.id)
+            .all()
+        )
+        for reply in replies:
+            children_by_parent[reply.parent_id].append(reply)
+
+    def build(comment):
+        return comment.serialize(replies=[build(child) for child in children_by_parent[comment.id]])
+
+    return [build(root) for root in roots], next_cursor
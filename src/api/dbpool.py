@@ -0,0 +1,103 @@
+"""
+SQLAlchemy engine pooling: configuration from the environment, pool metrics
+and pool-timeout handling.
+
+DB_POOL_SIZE / DB_MAX_OVERFLOW    connections kept / extra allowed under burst (per worker)
+DB_POOL_TIMEOUT                   seconds a request waits for a free connection
+DB_POOL_RECYCLE                   reconnect connections older than this (seconds)
+DB_POOL_PRE_PING=1                test each connection on checkout, so connections
+                                  killed by a Postgres restart are replaced, not returned
+DB_POOLER=pgbouncer               an external pooler owns the connections: use NullPool
+                                  and no server-side prepared statements
+
+Pool gauges are updated on checkout/checkin rather than at scrape time. In
+multiprocess mode every worker's pool then stays current in /metrics, not
+only the pool of the worker that answers the scrape.
+"""
+import os
+from flask import jsonify
+from prometheus_client import Counter, Gauge
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+POOL_SIZE = Gauge("db_pool_size", "Configured pool size", ["pool", "pid"], multiprocess_mode="liveall")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", ["pool", "pid"], multiprocess_mode="liveall")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size", ["pool", "pid"], multiprocess_mode="liveall")
+POOL_CONNECTS = Counter("db_pool_connections_total", "New DBAPI connections opened", ["pool"])
+POOL_INVALIDATED = Counter("db_pool_invalidated_total", "Connections discarded as broken or stale", ["pool"])
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Requests that gave up waiting for a connection")
+
+
+def uses_external_pooler():
+    return os.getenv("DB_POOLER", "").lower() == "pgbouncer"
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS for url, from the DB_* environment variables."""
+    options = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"}
+    if url.startswith("sqlite"):
+        return options
+    if uses_external_pooler():
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        )
+    if url.startswith("postgresql"):
+        # Fail fast on an unreachable server and notice silently dropped TCP connections
+        options["connect_args"] = {
+            "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 10)),
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 3,
+        }
+    return options
+
+
+def async_connect_args():
+    """asyncpg caches prepared statements per connection, which breaks behind a transaction-mode pooler."""
+    if uses_external_pooler():
+        return {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+    return {}
+
+
+def instrument_pool(engine, name):
+    pool = engine.pool
+
+    def checked_out(*args):
+        pid = str(os.getpid())
+        POOL_CHECKED_OUT.labels(name, pid).inc()
+        POOL_SIZE.labels(name, pid).set(pool.size())
+        POOL_OVERFLOW.labels(name, pid).set(max(pool.overflow(), 0))
+
+    def checked_in(*args):
+        POOL_CHECKED_OUT.labels(name, str(os.getpid())).dec()
+
+    def connected(*args):
+        POOL_CONNECTS.labels(name).inc()
+
+    def invalidated(*args):
+        POOL_INVALIDATED.labels(name).inc()
+
+    event.listen(pool, "connect", connected)
+    event.listen(pool, "invalidate", invalidated)
+    event.listen(pool, "soft_invalidate", invalidated)
+    # NullPool (SQLite files, DB_POOLER) keeps nothing to report on
+    if isinstance(pool, QueuePool):
+        event.listen(pool, "checkout", checked_out)
+        event.listen(pool, "checkin", checked_in)
+
+
+def setup_pool_metrics(app, db):
+    with app.app_context():
+        instrument_pool(db.engine, "primary")
+
+    @app.errorhandler(PoolTimeoutError)
+    def handle_pool_timeout(error):
+        POOL_TIMEOUTS.inc()
+        return jsonify({"error": "Database is busy, please retry"}), 503, {"Retry-After": "1"}
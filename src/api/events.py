@@ -0,0 +1,129 @@
+"""
+Per-user event push over Server-Sent Events.
+
+Producers call publish(user_id, event, data) after their commit. Clients
+hold one GET /api/events/stream connection and receive the events as they
+happen, instead of polling /users/notifications. An idle client costs no
+queries and no DB connection: the stream only waits on an in-memory
+subscription.
+
+EVENTS_URL unset      -> in-process fan-out. It only reaches clients connected
+                         to the same worker, which is enough for `flask run`
+                         and single-worker deployments.
+EVENTS_URL=redis://   -> every worker publishes to one Redis channel. A listener
+                         thread per worker feeds that worker's subscribers.
+
+Under gunicorn's sync workers each open stream pins a worker. Serve streams
+through the ASGI entry point (api/asyncapi.py), where they cost a coroutine.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 15
+RETRY_MS = 5000
+CHANNEL = "greenbizlink:events"
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> set of callbacks
+
+    def subscribe(self, user_id, callback):
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(callback)
+
+    def unsubscribe(self, user_id, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(user_id)
+            if callbacks:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self._subscribers[user_id]
+
+    def dispatch(self, user_id, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(user_id, ()))
+        for callback in callbacks:
+            callback(message)
+
+    def publish(self, user_id, event, data):
+        self.dispatch(user_id, format_event(event, data))
+
+
+class RedisBroker(LocalBroker):
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("EVENTS_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self._listener_pid = None
+
+    def publish(self, user_id, event, data):
+        self.client.publish(CHANNEL, json.dumps({"user_id": user_id, "message": format_event(event, data)}))
+
+    def subscribe(self, user_id, callback):
+        # A listener thread doesn't survive gunicorn's fork; start one per worker
+        if self._listener_pid != os.getpid():
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen, daemon=True).start()
+        super().subscribe(user_id, callback)
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        for item in pubsub.listen():
+            try:
+                payload = json.loads(item["data"])
+                self.dispatch(payload["user_id"], payload["message"])
+            except Exception:
+                logger.exception("bad event on %s", CHANNEL)
+
+
+def format_event(event, data):
+    return "event: %s\ndata: %s\n\n" % (event, json.dumps(data))
+
+
+def stream_events(broker, user_id):
+    """Blocking SSE body for WSGI servers: one queue per connection, keepalive comments while idle."""
+    messages = queue.Queue()
+    broker.subscribe(user_id, messages.put)
+    try:
+        yield "retry: %d\n\n" % RETRY_MS
+        while True:
+            try:
+                yield messages.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(user_id, messages.put)
+
+
+def setup_events(app):
+    app.config.setdefault("EVENTS_URL", os.getenv("EVENTS_URL"))
+    url = app.config["EVENTS_URL"]
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        app.extensions["events"] = RedisBroker(url)
+    else:
+        app.extensions["events"] = LocalBroker()
+
+
+def get_events():
+    return current_app.extensions["events"]
+
+
+def publish(user_id, event, data):
+    """Push an event to user_id's open streams. Call after the change is committed."""
+    try:
+        get_events().publish(user_id, event, data)
+    except Exception:
+        # Push is best effort; clients still see the change on their next fetch
+        logger.exception("failed to publish %s to user %s", event, user_id)
@@ -0,0 +1,99 @@
+"""
+Connection graph over accepted ("connected") Connection rows.
+
+Edges are directed rows in the table but a connection is mutual once
+accepted, so each user's adjacency is the union of both directions. It is
+cached per user as a sorted list of ids (JSON-friendly for a shared cache),
+loaded in one indexed query on a miss, and invalidated for both endpoints
+whenever an edge changes status or is deleted.
+"""
+from collections import Counter
+from sqlalchemy import or_
+from api.models import db, Connection, User
+from api.cache import get_cache
+
+ADJACENCY_TTL = 600
+MAX_NEIGHBORS_EXPANDED = 500  # bound on first-degree fan-out for suggestions
+LOAD_CHUNK = 500
+
+
+def _key(user_id):
+    return "graph:adj:" + str(user_id)
+
+
+def _load_adjacency(user_ids):
+    adjacency = {user_id: set() for user_id in user_ids}
+    ids = list(user_ids)
+    for start in range(0, len(ids), LOAD_CHUNK):
+        chunk = ids[start:start + LOAD_CHUNK]
+        rows = db.session.query(Connection.user_id, Connection.connected_user_id).filter(
+            Connection.status == "connected",
+            or_(Connection.user_id.in_(chunk), Connection.connected_user_id.in_(chunk))
+        ).all()
+        for a, b in rows:
+            if a in adjacency:
+                adjacency[a].add(b)
+            if b in adjacency:
+                adjacency[b].add(a)
+    return adjacency
+
+
+def get_adjacency_many(user_ids):
+    """{user_id: set(neighbor ids)}; cache misses are loaded together."""
+    cache = get_cache()
+    user_ids = list(user_ids)
+    result, missing = {}, []
+    # One round trip each way with Redis, however many users are asked for
+    for user_id, cached in zip(user_ids, cache.get_many([_key(user_id) for user_id in user_ids])):
+        if cached is None:
+            missing.append(user_id)
+        else:
+            result[user_id] = set(cached)
+    if missing:
+        loaded = _load_adjacency(missing)
+        cache.set_many({_key(user_id): sorted(neighbors) for user_id, neighbors in loaded.items()}, ADJACENCY_TTL)
+        result.update(loaded)
+    return result
+
+
+def get_adjacency(user_id):
+    return get_adjacency_many([user_id])[user_id]
+
+
+def connection_changed(user_id, other_id):
+    """Call after committing a change to the edge between two users."""
+    get_cache().delete(_key(user_id), _key(other_id))
+
+
+def mutual_connections(user_id, other_id):
+    adjacency = get_adjacency_many([user_id, other_id])
+    return other_id in adjacency[user_id], sorted(adjacency[user_id] & adjacency[other_id])
+
+
+def suggest_connections(user_id, limit=20):
+    """Second-degree users ranked by how many connections they share with user_id."""
+    neighbors = get_adjacency(user_id)
+    expanded = sorted(neighbors)[:MAX_NEIGHBORS_EXPANDED]
+    counts = Counter()
+    for friends in get_adjacency_many(expanded).values():
+        counts.update(friends)
+    for excluded in neighbors | {user_id}:
+        counts.pop(excluded, None)
+    return counts.most_common(limit)
+
+
+def user_summaries(user_ids):
+    """{id: summary dict} for the given users in one query."""
+    if not user_ids:
+        return {}
+    rows = db.session.query(User.id, User.name, User.role, User.city, User.state).filter(User.id.in_(user_ids)).all()
+    return {
+        row.id: {
+            "id": row.id,
+            "name": row.name,
+            "role": row.role.value if row.role else None,
+            "city": row.city,
+            "state": row.state
+        }
+        for row in rows
+    }
@@ -0,0 +1,105 @@
+"""
+HTTP caching: conditional GET for JSON reads, and Cache-Control for the
+frontend build in public/.
+
+Every 200 JSON response to a GET gets a weak ETag hashed from its body.
+A client that sends it back in If-None-Match gets a body-less 304. That
+saves the transfer but not the work of building the response. Views
+wrapped in @conditional(validator) go further: validator(**view_args)
+returns a cheap version of what the view would render, such as the ids on
+a page or max(updated_at). When the client's ETag still matches, the
+view, its queries and the JSON encoding are all skipped.
+
+Responses are marked "no-cache", so clients always revalidate, and
+"private" when the request carried credentials. Webpack bundles with a
+content hash in their name never change, so they are cached for a year
+as immutable. index.html, which names the current bundle, is always
+revalidated.
+
+HTTP_ETAGS=0 turns the JSON ETags off.
+"""
+import hashlib
+import os
+import re
+from functools import wraps
+from flask import Response, current_app, make_response, request
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# main.3f9a1c2e7b.js, 0f1e2d3c4b5a6978.png: webpack's [contenthash] before the extension
+HASHED_ASSET = re.compile(r"(^|[./])[0-9a-f]{8,32}\.[A-Za-z0-9]+$")
+
+
+def version_etag(version):
+    """Weak ETag value for a validator's version of the current URL (path and query string)."""
+    raw = repr((request.path, sorted(request.args.items(multi=True)), version)).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def _cache_control(response):
+    if response.cache_control.no_cache or response.cache_control.max_age is not None:
+        return
+    response.cache_control.no_cache = True
+    if request.authorization is not None or request.args.get("jwt"):
+        response.cache_control.private = True
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    _cache_control(response)
+    return response
+
+
+def conditional(validator):
+    """Answer 304 before running the view when validator(**view_args) is unchanged; None skips the check."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not current_app.config["HTTP_ETAGS"]:
+                return fn(*args, **kwargs)
+            version = validator(**kwargs)
+            if version is None:
+                return fn(*args, **kwargs)
+            # Computed before the view: a write in between only makes the next check miss
+            etag = version_etag(version)
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def is_hashed_asset(path):
+    return bool(HASHED_ASSET.search(path))
+
+
+def static_cache_headers(response, path):
+    """Cache-Control for a file sent from public/."""
+    if is_hashed_asset(path):
+        response.cache_control.no_cache = None  # drop send_file's default no-cache
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Revalidated every time against the ETag/Last-Modified send_from_directory sets
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = None
+    return response
+
+
+def setup_http_cache(app):
+    app.config.setdefault("HTTP_ETAGS", os.getenv("HTTP_ETAGS", "1") == "1")
+
+    @app.after_request
+    def add_etag(response):
+        if (not app.config["HTTP_ETAGS"] or request.method not in ("GET", "HEAD")
+                or response.status_code != 200 or not response.is_json
+                or response.is_streamed or response.direct_passthrough):
+            return response
+        if not response.get_etag()[0]:
+            response.add_etag(weak=True)
+        _cache_control(response)
+        return response.make_conditional(request)
@@ -0,0 +1,42 @@
+"""
+Eager-load plans for model serializers.
+
+Each plan is a tuple of loader options matching exactly what a serialize()
+call touches, so a page of rows serializes in a fixed number of queries
+instead of one lazy load per relationship per row.
+Use them as Model.query.options(*PLAN).
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from api.models import Company, User, JobPosting, UserMedia, Advertisement
+
+# Company.serialize only emits the ids of these collections
+COMPANY_SERIALIZE = (
+    selectinload(Company.employees).load_only(User.id),
+    selectinload(Company.jobs).load_only(JobPosting.id),
+    selectinload(Company.videos).load_only(UserMedia.id),
+)
+
+# User.serialize embeds the full company serialization
+USER_SERIALIZE = (
+    joinedload(User.company).selectinload(Company.employees).load_only(User.id),
+    joinedload(User.company).selectinload(Company.jobs).load_only(JobPosting.id),
+    joinedload(User.company).selectinload(Company.videos).load_only(UserMedia.id),
+)
+
+USER_SERIALIZE_WITH_INTERESTS = USER_SERIALIZE + (selectinload(User.interests),)
+
+# Advertisement.serialize only reads company.name
+ADVERTISEMENT_SERIALIZE = (
+    joinedload(Advertisement.company).load_only(Company.name),
+)
+
+# Upper bound on SQL statements per request, checked by `flask check-query-budgets`.
+# Keys are endpoint names; values are the plan's expected query count.
+# get_jobs and get_job_comments include their ETag validator query (api.httpcache).
+QUERY_BUDGETS = {
+    "api.get_users": 4,
+    "api.get_companies": 4,
+    "api.get_jobs": 2,
+    "api.get_job_comments": 4,
+    "api.get_ads": 1,
+}
@@ -0,0 +1,109 @@
+"""
+Prometheus metrics, scraped from GET /metrics.
+
+Every request is counted and timed per endpoint. The in-flight gauge is
+labelled by worker pid, and the SQL totals from api/profiling.py are
+recorded here too.
+
+gunicorn workers are separate processes. With PROMETHEUS_MULTIPROC_DIR
+set, prometheus_client's multiprocess mode gives each worker its own
+mmap'd files, so a metric update is a local memory write with no
+cross-process locking. A scrape of any worker merges all of them.
+src/gunicorn.conf.py empties the directory at startup and retires dead
+workers. Without the variable (flask run, single process), the default
+in-process registry is served.
+
+The statement label carries SQL text, so outside debug mode /metrics
+answers only with "Authorization: Bearer <METRICS_TOKEN>". Without a
+token configured, it is not served at all.
+"""
+import os
+import time
+from flask import Response, abort, current_app, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+MAX_FINGERPRINTS = 1000
+
+REQUESTS = Counter("http_requests_total", "Requests handled", ["endpoint", "method", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["endpoint", "method"],
+                    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+EXCEPTIONS = Counter("http_request_exceptions_total", "Requests that raised an unhandled exception", ["endpoint"])
+IN_PROGRESS = Gauge("http_requests_in_progress", "Requests currently being handled, per worker", ["pid"],
+                    multiprocess_mode="liveall")
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["endpoint"])
+DB_SECONDS = Counter("db_seconds_total", "Time spent executing SQL", ["endpoint"])
+DB_BUDGET_EXCEEDED = Counter("db_budget_exceeded_total", "Requests over the SQL query or time budget", ["endpoint"])
+DB_STATEMENT_SECONDS = Counter("db_statement_seconds_total", "Time spent per statement fingerprint",
+                               ["fingerprint", "statement"])
+
+_seen_fingerprints = set()
+
+
+def _endpoint():
+    return request.endpoint or "unmatched"
+
+
+def record_sql(endpoint, profile, over_budget):
+    """Called by api.profiling when a request finishes."""
+    DB_QUERIES.labels(endpoint).inc(profile.queries)
+    DB_SECONDS.labels(endpoint).inc(profile.db_seconds)
+    if over_budget:
+        DB_BUDGET_EXCEEDED.labels(endpoint).inc()
+    for fp, count, seconds, statement in profile.grouped():
+        # Bound label cardinality; query shapes are normally far fewer than this
+        if fp not in _seen_fingerprints:
+            if len(_seen_fingerprints) >= MAX_FINGERPRINTS:
+                continue
+            _seen_fingerprints.add(fp)
+        DB_STATEMENT_SECONDS.labels(fp, " ".join(statement.split())[:120]).inc(seconds)
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    IN_PROGRESS.labels(str(os.getpid())).inc()
+
+
+def _record_response(response):
+    if "metrics_started" in g:
+        endpoint = _endpoint()
+        LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - g.metrics_started)
+        REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        g.metrics_recorded = True
+    return response
+
+
+def _finish_request(exc):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    IN_PROGRESS.labels(str(os.getpid())).dec()
+    if exc is not None:
+        EXCEPTIONS.labels(_endpoint()).inc()
+        # Propagated exceptions (debug/testing) never reach after_request
+        if not g.pop("metrics_recorded", False):
+            LATENCY.labels(_endpoint(), request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(_endpoint(), request.method, "500").inc()
+
+
+def metrics():
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        if not current_app.debug:
+            abort(404)
+    elif request.headers.get("Authorization") != "Bearer " + token:
+        abort(401)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app):
+    app.config.setdefault("METRICS_TOKEN", os.getenv("METRICS_TOKEN"))
+    app.before_request(_start_request)
+    app.after_request(_record_response)
+    app.teardown_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
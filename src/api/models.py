@@ -1,9 +1,11 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from enum import Enum
+from api.replicas import RoutingSession
 
-# Initialize database
-db = SQLAlchemy()
+# Initialize database; reads in @use_replica routes may go to a replica (api/replicas.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 
 # Models
@@ -63,13 +65,14 @@ class User(db.Model):
     city = db.Column(db.String(50))
     state = db.Column(db.String(50))
     profile_image = db.Column(db.String(250))
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'))
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), index=True)
 
     # New Fields
     is_verified = db.Column(db.Boolean, default=False)  # Tracks email verification
     last_login = db.Column(db.DateTime, nullable=True)  # Tracks last login time
 
     # Relationships
+    company = db.relationship("Company", back_populates="employees")
     interests = db.relationship("Interest", secondary=user_interests, back_populates="users")
     job_applications = db.relationship("JobApplication", back_populates="user", lazy=True)
     media_files = db.relationship("UserMedia", back_populates="user")
@@ -93,16 +96,11 @@ class User(db.Model):
             data["interests"] = [interest.name for interest in self.interests]
         return data
 
-class TokenBlocklist(db.Model):
-    __tablename__ = "token_blocklist"
-
-    id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(36), nullable=False, unique=True)  # JWT Token ID
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    def serialize(self):
-        return {"id": self.id, "jti": self.jti, "created_at": self.created_at.isoformat()}
-
+    def serialize_public(self, include_interests=False):
+        """serialize() without the email address, for listings anyone can read."""
+        data = self.serialize(include_interests=include_interests)
+        del data["email"]
+        return data
 
 class TokenBlocklist(db.Model):
     __tablename__ = "token_blocklist"
@@ -110,11 +108,15 @@ class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), nullable=False, unique=True)  # JWT Token ID
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    __table_args__ = {'extend_existing': True}  # Fix duplicate definition issue
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # Token's own expiry; row can be purged after this
 
     def serialize(self):
-        return {"id": self.id, "jti": self.jti, "created_at": self.created_at.isoformat()}
+        return {
+            "id": self.id,
+            "jti": self.jti,
+            "created_at": self.created_at.isoformat(),
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None
+        }
 
 
 class Company(db.Model):
@@ -135,7 +137,7 @@ class Company(db.Model):
     description = db.Column(db.Text)
 
     # Relationships
-    employees = db.relationship('User', backref='company', lazy=True, cascade="all, delete")
+    employees = db.relationship('User', back_populates='company', lazy=True, cascade="all, delete")
     jobs = db.relationship('JobPosting', back_populates='company', lazy=True, cascade="all, delete")
     videos = db.relationship('UserMedia', back_populates='company', lazy=True, cascade="all, delete")
 
@@ -175,6 +177,13 @@ class Connection(db.Model):
                                    foreign_keys=[connected_user_id],
                                    backref=db.backref('received_connections', lazy=True))
 
+    __table_args__ = (
+        # add_connection's duplicate check, and outgoing edges by user
+        db.Index('ix_connection_user_id_connected_user_id', 'user_id', 'connected_user_id'),
+        # pending requests / notifications: received edges filtered by status, newest first
+        db.Index('ix_connection_connected_user_id_status_created_at', 'connected_user_id', 'status', 'created_at'),
+    )
+
     def serialize(self):
         return {
             'id': self.id,
@@ -188,8 +197,8 @@ class FavoriteConnect(db.Model):
     __tablename__ = 'favorite_connect'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    favorite_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    favorite_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
 
     user = db.relationship('User', foreign_keys=[user_id], backref='favorite_connections')
@@ -204,13 +213,21 @@ class JobPosting(db.Model):
     description = db.Column(db.Text, nullable=False)
     location = db.Column(db.String(100), nullable=False)
     salary = db.Column(db.String(50))
-    posted_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    posted_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'))  # Links job to company
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     company = db.relationship('Company', back_populates='jobs')
 
+    # Keyset pagination indexes for the /jobs feed (newest first, optionally filtered)
+    __table_args__ = (
+        db.Index('ix_job_posting_created_at_id', 'created_at', 'id'),
+        db.Index('ix_job_posting_category_created_at_id', 'category', 'created_at', 'id'),
+        db.Index('ix_job_posting_location_created_at_id', 'location', 'created_at', 'id'),
+        db.Index('ix_job_posting_company_id_created_at_id', 'company_id', 'created_at', 'id'),
+    )
+
     def serialize(self):
         return {
             "id": self.id,
@@ -230,19 +247,27 @@ class JobComment(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     job_id = db.Column(db.Integer, db.ForeignKey('job_posting.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'))  # Links comment to a company
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), index=True)  # Links comment to a company
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    parent_id = db.Column(db.Integer, db.ForeignKey('job_comment.id'))  # For threaded replies
+    parent_id = db.Column(db.Integer, db.ForeignKey('job_comment.id'), index=True)  # For threaded replies
 
     user = db.relationship('User', backref='job_comments')
     job = db.relationship('JobPosting', backref='comments', lazy=True)
     company = db.relationship('Company', backref='job_comments', lazy=True)
     parent_comment = db.relationship('JobComment', remote_side=[id], backref='replies')
 
-    def serialize(self):
+    # Top-level comment pages for a job (parent_id IS NULL), newest first
+    __table_args__ = (
+        db.Index('ix_job_comment_job_id_parent_id_created_at_id', 'job_id', 'parent_id', 'created_at', 'id'),
+    )
+
+    def serialize(self, replies=None):
+        # Pass already-serialized replies to avoid one lazy load per node (see api.comments)
+        if replies is None:
+            replies = [reply.serialize() for reply in self.replies]
         return {
             "id": self.id,
             "job_id": self.job_id,
@@ -252,7 +277,7 @@ class JobComment(db.Model):
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
             "parent_id": self.parent_id,
-            "replies": [reply.serialize() for reply in self.replies]
+            "replies": replies
         }
 
 
@@ -260,9 +285,9 @@ class JobApplication(db.Model):
     __tablename__ = 'job_application'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    job_id = db.Column(db.Integer, db.ForeignKey('job_posting.id'), nullable=False)
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'))  # Links job application to company
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job_posting.id'), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), index=True)  # Links job application to company
     applied_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String, default='pending')  # pending, accepted, rejected
     resume_file_path = db.Column(db.String(255))  # Stores file path of resume
@@ -288,8 +313,8 @@ class UserMedia(db.Model):
     __tablename__ = 'user_media'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=True, index=True)
     file_name = db.Column(db.String(255), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # 'image' or 'video'
     file_path = db.Column(db.String(255), nullable=False)
@@ -314,7 +339,7 @@ class UserImage(db.Model):
     __tablename__ = 'user_images'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     file_name = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(255), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -337,16 +362,22 @@ class Advertisement(db.Model):
     __tablename__ = "advertisements"
 
     id = db.Column(db.Integer, primary_key=True)
-    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey("company.id"), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(255))  # Optional image for the ad
     link = db.Column(db.String(255), nullable=False)  # External link for the ad
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     active = db.Column(db.Boolean, default=True)
+    weight = db.Column(db.Float, nullable=False, default=1.0, server_default='1')  # Relative share of impressions
 
     company = db.relationship("Company", backref="advertisements")
 
+    # get_ads: active ads only
+    __table_args__ = (
+        db.Index('ix_advertisements_active_created_at', 'active', 'created_at'),
+    )
+
     def serialize(self):
         return {
             "id": self.id,
@@ -356,5 +387,122 @@ class Advertisement(db.Model):
             "image_url": self.image_url,
             "link": self.link,
             "created_at": self.created_at.isoformat(),
-            "active": self.active
+            "active": self.active,
+            "weight": self.weight
+        }
+
+
+class AdStat(db.Model):
+    """Daily impression/click totals per ad, written in batches by api.adstats."""
+    __tablename__ = "ad_stats"
+
+    ad_id = db.Column(db.Integer, db.ForeignKey("advertisements.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    impressions = db.Column(db.Integer, nullable=False, default=0)
+    clicks = db.Column(db.Integer, nullable=False, default=0)
+
+    def serialize(self):
+        return {
+            "ad_id": self.ad_id,
+            "day": self.day.isoformat(),
+            "impressions": self.impressions,
+            "clicks": self.clicks,
+            "ctr": round(self.clicks / self.impressions, 4) if self.impressions else 0.0
+        }
+
+
+class Task(db.Model):
+    """A unit of background work, claimed and run by `flask run-worker` (see api.tasks)."""
+    __tablename__ = "task"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")  # JSON arguments for the handler
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Higher runs first
+    status = db.Column(db.String(20), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime)  # Visibility timeout while running
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    # Workers poll for the highest-priority runnable task
+    __table_args__ = (
+        db.Index('ix_task_status_priority_run_after', 'status', 'priority', 'run_after'),
+    )
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "priority": self.priority,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_after": self.run_after.isoformat(),
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class UploadSession(db.Model):
+    """A resumable chunked upload in progress (see api.uploads)."""
+    __tablename__ = "upload_session"
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, used in URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'video' or 'resume'
+    file_name = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0)  # Bytes safely on disk
+    job_id = db.Column(db.Integer, db.ForeignKey('job_posting.id'))  # For resumes
+    status = db.Column(db.String(20), nullable=False, default="open")  # open, committed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            "upload_id": self.id,
+            "kind": self.kind,
+            "file_name": self.file_name,
+            "total_size": self.total_size,
+            "offset": self.received,
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat()
+        }
+
+
+class Notification(db.Model):
+    """An entry in a user's notification inbox, written by notify() (see api.notifications)."""
+    __tablename__ = "notification"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # Recipient
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Who caused it, if anyone
+    kind = db.Column(db.String(50), nullable=False)  # connection_request, application_status, comment_reply, ...
+    message = db.Column(db.String(255), nullable=False)
+    data = db.Column(db.Text, nullable=False, default="{}")  # JSON ids the client links to
+    read_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # Inbox pages are newest-first per user; the unread count filters on read_at IS NULL
+    __table_args__ = (
+        db.Index('ix_notification_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_notification_user_id_read_at', 'user_id', 'read_at'),
+    )
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "message": self.message,
+            "data": json.loads(self.data or "{}"),
+            "actor_id": self.actor_id,
+            "read": self.read_at is not None,
+            "read_at": self.read_at.isoformat() if self.read_at else None,
+            "created_at": self.created_at.isoformat()
         }
@@ -0,0 +1,86 @@
+"""
+Persistent notification inbox.
+
+Producers call notify() in the request that causes the event. Like
+enqueue() in api.tasks, the Notification row is added to the caller's
+session, so it commits or rolls back with the caller's own changes. Once
+the session commits:
+- each recipient's cached unread counter is bumped, and
+- a "notification" event is pushed to the recipient's open streams (api.events).
+
+The badge reads unread_count(), which is served from the cache. A COUNT
+query runs only on a miss, and the rows it counts are covered by
+ix_notification_user_id_read_at. Marking as read decrements the counter by
+the number of rows the UPDATE changed. With CACHE_URL unset, each worker
+keeps its own counter, so a badge can trail by up to CACHE_DEFAULT_TTL;
+with Redis, all workers share one counter.
+"""
+import json
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from api.cache import get_cache, get_or_set, invalidate
+from api.events import publish
+from api.models import db, Notification
+from api.replicas import RoutingSession
+
+MAX_MARK_READ = 500
+
+
+def unread_key(user_id):
+    return "notifications:unread:%d" % user_id
+
+
+def notify(user_id, kind, message, actor_id=None, **data):
+    """Add a notification for user_id to the current session; the caller commits."""
+    user_id = int(user_id)
+    if actor_id is not None and int(actor_id) == user_id:
+        return None  # Nobody needs telling about their own actions
+    notification = Notification(user_id=user_id, actor_id=actor_id, kind=kind, message=message[:255],
+                                data=json.dumps(data), created_at=datetime.utcnow())
+    db.session.add(notification)
+    db.session.flush()
+    # Attributes are expired by the commit and can't be loaded in after_commit, so snapshot them now
+    db.session.info.setdefault("notifications", []).append((user_id, notification.serialize()))
+    return notification
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    pending = session.info.pop("notifications", None)
+    if not pending or not has_app_context():
+        return
+    cache = get_cache()
+    for user_id, payload in pending:
+        cache.incr(unread_key(user_id), 1)
+        publish(user_id, "notification", payload)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("notifications", None)
+
+
+def unread_count(user_id):
+    return get_or_set(unread_key(user_id), lambda: Notification.query.filter_by(
+        user_id=user_id, read_at=None).count())
+
+
+def mark_read(user_id, ids=None):
+    """Mark user_id's notifications read: those in ids, or all of them if ids is None. Returns the number changed."""
+    query = Notification.query.filter(Notification.user_id == user_id, Notification.read_at.is_(None))
+    if ids is not None:
+        if not ids:
+            return 0
+        query = query.filter(Notification.id.in_(ids))
+    changed = query.update({Notification.read_at: datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+
+    if ids is None:
+        get_cache().set(unread_key(user_id), 0, current_app.config["CACHE_DEFAULT_TTL"])
+    elif changed:
+        remaining = get_cache().incr(unread_key(user_id), -changed)
+        if remaining is not None and remaining < 0:
+            # The counter raced with another writer; drop it and let the next read recount
+            invalidate(unread_key(user_id))
+    return changed
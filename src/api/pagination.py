@@ -0,0 +1,85 @@
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+from api.utils import APIException
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Read ?limit= from the query string, clamped to [1, maximum]."""
+    return clamp_page_size(request.args.get("limit", default), maximum)
+
+
+def clamp_page_size(value, maximum=MAX_PAGE_SIZE):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise APIException("limit must be an integer", status_code=400)
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for the row a page ended on."""
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise APIException("Invalid cursor", status_code=400)
+
+
+def encode_id_cursor(row_id):
+    return base64.urlsafe_b64encode(json.dumps([row_id]).encode()).decode().rstrip("=")
+
+
+def decode_id_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        (row_id,) = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(row_id)
+    except (ValueError, TypeError):
+        raise APIException("Invalid cursor", status_code=400)
+
+
+def id_page(query, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Ascending keyset pagination on a primary key alone, for tables with no timestamp."""
+    if cursor:
+        query = query.filter(id_col > decode_id_cursor(cursor))
+    rows = query.order_by(id_col).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_id_cursor(getattr(rows[-1], id_col.key))
+    return rows, next_cursor
+
+
+def keyset_page(query, created_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Newest-first keyset pagination on (created_col, id_col).
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    created_col must be non-null (it is set by a column default everywhere we use this).
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < row_id),
+        ))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
@@ -0,0 +1,131 @@
+"""
+Per-request SQL profiling.
+
+SQLAlchemy engine events time every statement. The numbers are charged to
+the current request (kept in flask.g), and each statement is reduced to a
+fingerprint: literals and IN-lists are replaced, so the same query shape
+counts as one statement whatever its parameters. When a request finishes:
+- its query count and DB time are recorded per endpoint (and DB time per
+  fingerprint) in the metrics served by GET /metrics (api/metrics.py);
+- in debug mode (or with SQL_PROFILE_HEADERS), they are also returned as
+  X-DB-Queries, X-DB-Time-Ms and Server-Timing headers;
+- if it exceeded SQL_BUDGET_QUERIES or SQL_BUDGET_MS, it is logged with
+  its statements grouped by fingerprint, slowest first.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from api.metrics import record_sql
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_QUERIES = 20
+DEFAULT_BUDGET_MS = 500
+MAX_STATEMENTS_PER_REQUEST = 500
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|:\w+|\$\d+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement):
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip()
+    return _LIST.sub("(?...)", sql)
+
+
+def fingerprint(statement):
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = []  # (fingerprint, statement, seconds)
+
+    def record(self, statement, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        if len(self.statements) < MAX_STATEMENTS_PER_REQUEST:
+            self.statements.append((fingerprint(statement), statement, seconds))
+
+    def grouped(self):
+        """[(fingerprint, count, seconds, sample statement)], most expensive first."""
+        groups = {}
+        for fp, statement, seconds in self.statements:
+            count, total, _ = groups.get(fp, (0, 0.0, statement))
+            groups[fp] = (count + 1, total + seconds, statement)
+        return sorted(((fp, c, s, sql) for fp, (c, s, sql) in groups.items()), key=lambda row: -row[2])
+
+
+def _current_profile():
+    if has_app_context():
+        return g.get("sql_profile")
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_profile_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    profile = _current_profile()
+    if profile is not None:
+        profile.record(statement, elapsed)
+
+
+def _start_profile():
+    g.sql_profile = RequestProfile()
+
+
+def _finish_profile(response):
+    profile = g.pop("sql_profile", None)
+    if profile is None:
+        return response
+    config = current_app.config
+    db_ms = profile.db_seconds * 1000
+    total_ms = (time.perf_counter() - profile.started) * 1000
+    over_budget = profile.queries > config["SQL_BUDGET_QUERIES"] or db_ms > config["SQL_BUDGET_MS"]
+    endpoint = request.endpoint or "unmatched"
+    record_sql(endpoint, profile, over_budget)
+
+    if config["SQL_PROFILE_HEADERS"]:
+        response.headers["X-DB-Queries"] = str(profile.queries)
+        response.headers["X-DB-Time-Ms"] = "%.2f" % db_ms
+        response.headers.add("Server-Timing", "db;dur=%.2f, app;dur=%.2f" % (db_ms, total_ms))
+
+    if over_budget:
+        details = "\n".join("  %dx %.1fms [%s] %s" % (count, seconds * 1000, fp, " ".join(sql.split())[:300])
+                            for fp, count, seconds, sql in profile.grouped()[:20])
+        logger.warning("%s %s (%s): %d queries, %.1fms in DB, %.1fms total\n%s",
+                       request.method, request.path, endpoint, profile.queries, db_ms, total_ms, details)
+    return response
+
+
+def setup_profiling(app):
+    app.config.setdefault("SQL_BUDGET_QUERIES", int(os.getenv("SQL_BUDGET_QUERIES", DEFAULT_BUDGET_QUERIES)))
+    app.config.setdefault("SQL_BUDGET_MS", float(os.getenv("SQL_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    app.config.setdefault("SQL_PROFILE_HEADERS", app.debug or "1" in (os.getenv("FLASK_DEBUG"), os.getenv("SQL_PROFILE_HEADERS")))
+
+    # Listening on Engine covers every engine the app creates
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
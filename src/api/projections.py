@@ -0,0 +1,56 @@
+"""
+Column projections for the big list endpoints.
+
+Querying a tuple of columns instead of the model skips ORM object
+construction, the identity map and attribute instrumentation. The row is
+turned straight into the dict that Model.serialize() would have produced.
+Keep each *_row function in step with its model's serialize(); the
+`flask benchmark-serialization` command checks that both paths agree.
+Use them as session.query(*COLUMNS) and row_fn(row) per row.
+"""
+from api.models import Advertisement, Company, JobPosting
+
+JOB_COLUMNS = (
+    JobPosting.id, JobPosting.title, JobPosting.category, JobPosting.description, JobPosting.location,
+    JobPosting.salary, JobPosting.posted_by, JobPosting.company_id, JobPosting.created_at,
+)
+
+
+def job_row(row):
+    return {
+        "id": row.id,
+        "title": row.title,
+        "category": row.category,
+        "description": row.description,
+        "location": row.location,
+        "salary": row.salary,
+        "posted_by": row.posted_by,
+        "company_id": row.company_id,
+        "created_at": row.created_at.isoformat()
+    }
+
+
+# Advertisement.serialize reads company.name; an inner join fetches it in the same query
+AD_COLUMNS = (
+    Advertisement.id, Company.name.label("company"), Advertisement.title, Advertisement.description,
+    Advertisement.image_url, Advertisement.link, Advertisement.created_at, Advertisement.active,
+    Advertisement.weight,
+)
+
+
+def ad_query(session):
+    return session.query(*AD_COLUMNS).join(Company, Advertisement.company_id == Company.id)
+
+
+def ad_row(row):
+    return {
+        "id": row.id,
+        "company": row.company,
+        "title": row.title,
+        "description": row.description,
+        "image_url": row.image_url,
+        "link": row.link,
+        "created_at": row.created_at.isoformat(),
+        "active": row.active,
+        "weight": row.weight
+    }
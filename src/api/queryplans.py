@@ -0,0 +1,82 @@
+"""
+EXPLAIN the query shapes issued by routes.py and report sequential scans.
+
+Used by `flask check-query-plans`. Run it against a seeded database: on a
+near-empty table the planner may legitimately prefer a scan.
+"""
+import json
+from sqlalchemy import literal, select
+from api.models import (db, User, Company, Connection, FavoriteConnect, JobPosting,
+                        JobComment, JobApplication, Advertisement)
+from api.projections import ad_query
+
+
+def route_queries():
+    """(name, Select) pairs mirroring the WHERE/ORDER BY of each read path in routes.py."""
+    user_id = db.session.query(User.id).order_by(User.id).limit(1).scalar() or 1
+    company_id = db.session.query(Company.id).order_by(Company.id).limit(1).scalar() or 1
+    job_id = db.session.query(JobPosting.id).order_by(JobPosting.id).limit(1).scalar() or 1
+
+    comment_tree = select(JobComment.id.label("id"), literal(1).label("depth")).where(
+        JobComment.id.in_([1, 2, 3])).cte("comment_tree", recursive=True)
+    comment_tree = comment_tree.union_all(
+        select(JobComment.id, comment_tree.c.depth + 1).where(JobComment.parent_id == comment_tree.c.id)
+    )
+
+    return [
+        ("get_jobs", JobPosting.query.order_by(JobPosting.created_at.desc(), JobPosting.id.desc()).limit(21)),
+        ("get_jobs?category", JobPosting.query.filter(JobPosting.category == "Budtender")
+            .order_by(JobPosting.created_at.desc(), JobPosting.id.desc()).limit(21)),
+        ("get_jobs?location", JobPosting.query.filter(JobPosting.location == "Denver, CO")
+            .order_by(JobPosting.created_at.desc(), JobPosting.id.desc()).limit(21)),
+        ("get_company_jobs", JobPosting.query.filter_by(company_id=company_id)),
+        ("get_job_comments", JobComment.query.filter(JobComment.job_id == job_id, JobComment.parent_id.is_(None))
+            .order_by(JobComment.created_at.desc(), JobComment.id.desc()).limit(21)),
+        ("get_job_comments replies", db.session.query(JobComment).join(comment_tree, JobComment.id == comment_tree.c.id)),
+        ("add_connection", Connection.query.filter_by(user_id=user_id, connected_user_id=user_id + 1)),
+        ("get_pending_requests", Connection.query.filter_by(connected_user_id=user_id, status="pending")),
+        ("get_favorite_users", FavoriteConnect.query.filter_by(user_id=user_id)),
+        ("company employees", User.query.filter(User.company_id == company_id)),
+        ("job applications", JobApplication.query.filter_by(job_id=job_id)),
+        ("get_ads", ad_query(db.session).filter(Advertisement.active == db.true())),
+    ]
+
+
+def _sqlite_seq_scans(conn, sql, tables):
+    scans = []
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql):
+        detail = row[-1]
+        words = detail.split()
+        # "SCAN job_posting" is a full table scan; "SCAN t USING INDEX ix" walks an index
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables and "USING" not in detail:
+            scans.append(words[1])
+    return scans
+
+
+def _postgres_seq_scans(conn, sql, tables):
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    stack = [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in tables:
+            scans.append(node["Relation Name"])
+        stack.extend(node.get("Plans", []))
+    return scans
+
+
+def find_seq_scans():
+    """Returns [(name, sql, [tables scanned sequentially])] for every route query."""
+    engine = db.engine
+    tables = set(db.metadata.tables)
+    explain = _postgres_seq_scans if engine.dialect.name == "postgresql" else _sqlite_seq_scans
+
+    results = []
+    with engine.connect() as conn:
+        for name, query in route_queries():
+            statement = getattr(query, "statement", query)
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            results.append((name, sql, explain(conn, sql, tables)))
+    return results
@@ -0,0 +1,157 @@
+"""
+Read-replica routing.
+
+DATABASE_REPLICA_URLS is a comma-separated list of read replicas. Routes
+decorated with @use_replica send their SELECTs to a replica. Everything
+else, and every write, goes to the primary (DATABASE_URL).
+
+In a replica request, the session picks one replica round-robin and keeps
+it for the rest of the request, so all its reads see one snapshot. Once
+the request flushes or executes a write (or a SELECT ... FOR UPDATE), it
+stays on the primary, so it reads its own writes. Replicas are checked
+for replication lag at most every REPLICA_LAG_CHECK_INTERVAL seconds. One
+that is unreachable, or further behind than REPLICA_MAX_LAG seconds, is
+skipped until a later check passes. With no usable replica, reads fall
+back to the primary.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from prometheus_client import Gauge
+from sqlalchemy import create_engine, text
+from sqlalchemy.sql import Select
+from api.dbpool import engine_options, instrument_pool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_LAG = 5.0
+DEFAULT_LAG_CHECK_INTERVAL = 5.0
+
+REPLICA_LAG = Gauge("db_replica_lag_seconds", "Replication lag at the last check (-1 if unreachable)",
+                    ["replica", "pid"], multiprocess_mode="liveall")
+
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.lag = 0.0
+        self.healthy = True
+
+
+class ReplicaSet:
+    def __init__(self, engines, max_lag=DEFAULT_MAX_LAG, check_interval=DEFAULT_LAG_CHECK_INTERVAL):
+        self.replicas = [Replica("replica%d" % i, engine) for i, engine in enumerate(engines)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._counter = itertools.count()
+        self._check_lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def _measure(self, replica):
+        with replica.engine.connect() as conn:
+            if conn.dialect.name != "postgresql":
+                return 0.0
+            return float(conn.execute(text(POSTGRES_LAG_SQL)).scalar() or 0)
+
+    def check(self):
+        for replica in self.replicas:
+            try:
+                replica.lag = self._measure(replica)
+                replica.healthy = replica.lag <= self.max_lag
+            except Exception as e:
+                replica.lag = -1
+                replica.healthy = False
+                logger.warning("replica %s unreachable: %s", replica.name, e)
+            REPLICA_LAG.labels(replica.name, str(os.getpid())).set(replica.lag)
+            if not replica.healthy:
+                logger.warning("replica %s skipped (lag %.1fs)", replica.name, replica.lag)
+
+    def _maybe_check(self):
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        # One thread refreshes; the others carry on with the previous result
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            self.check()
+            self._checked_at = time.monotonic()
+        finally:
+            self._check_lock.release()
+
+    def pick(self):
+        """A healthy replica's engine, round-robin, or None to use the primary."""
+        self._maybe_check()
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)].engine
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that routes reads in @use_replica requests to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not (has_app_context() and g.get("use_replica")):
+            return primary
+        if self.info.get("wrote"):
+            return primary
+
+        is_read = isinstance(clause, Select) and clause._for_update_arg is None and not self._flushing
+        if not is_read:
+            # Flushes, DML and raw SQL go to the primary, and so does everything after them
+            self.info["wrote"] = True
+            return primary
+
+        if "replica" not in self.info:
+            replicas = current_app.extensions.get("replicas")
+            self.info["replica"] = replicas.pick() if replicas else None
+        return self.info["replica"] or primary
+
+    def close(self):
+        self.info.pop("wrote", None)
+        self.info.pop("replica", None)
+        super().close()
+
+
+def all_engines(primary):
+    """primary plus every replica engine, for instrumentation that must see all of a request's SQL."""
+    replicas = current_app.extensions.get("replicas")
+    return [primary] + ([replica.engine for replica in replicas.replicas] if replicas else [])
+
+
+def use_replica(fn):
+    """Let this view's reads go to a read replica (see module docstring)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def setup_replicas(app):
+    urls = [url.strip().replace("postgres://", "postgresql://")
+            for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    app.config.setdefault("REPLICA_MAX_LAG", float(os.getenv("REPLICA_MAX_LAG", DEFAULT_MAX_LAG)))
+    app.config.setdefault("REPLICA_LAG_CHECK_INTERVAL",
+                          float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", DEFAULT_LAG_CHECK_INTERVAL)))
+    if not urls:
+        return
+
+    engines = [create_engine(url, **engine_options(url)) for url in urls]
+    replicas = ReplicaSet(engines, max_lag=app.config["REPLICA_MAX_LAG"],
+                          check_interval=app.config["REPLICA_LAG_CHECK_INTERVAL"])
+    for replica in replicas.replicas:
+        instrument_pool(replica.engine, replica.name)
+    app.extensions["replicas"] = replicas
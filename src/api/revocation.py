@@ -0,0 +1,149 @@
+"""
+In-process JWT revocation check.
+
+Every worker keeps a bloom filter of revoked jtis plus an exact set of the
+ones it has confirmed. A jti that misses the bloom filter is not revoked, so
+the common case costs a few hashes and no SQL. A bloom hit is confirmed
+against the exact set, then against token_blocklist, which only happens for
+revoked tokens or the rare false positive.
+
+The filter is warmed from token_blocklist on first use inside each worker.
+New rows from other workers are picked up every BLOCKLIST_REFRESH_INTERVAL
+seconds. The query rescans the last REFRESH_ID_WINDOW ids below the highest
+id seen, not just the ids above it. On Postgres an id is taken at insert
+time, so a logout can commit after a higher id is already visible; id order
+alone would skip it until the next rebuild. Bloom filters cannot delete, so
+the whole filter is rebuilt from unexpired rows every
+BLOCKLIST_REBUILD_INTERVAL seconds. `flask purge-token-blocklist` deletes the
+expired rows themselves.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from api.models import db, TokenBlocklist
+
+DEFAULT_REFRESH_INTERVAL = 5
+DEFAULT_REBUILD_INTERVAL = 3600
+REFRESH_ID_WINDOW = 500
+MIN_CAPACITY = 10000
+FALSE_POSITIVE_RATE = 0.001
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher: derive k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationIndex:
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL, rebuild_interval=DEFAULT_REBUILD_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._bloom = None
+        self._revoked = set()
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+
+    def _rebuild(self):
+        now = datetime.utcnow()
+        rows = (
+            db.session.query(TokenBlocklist.id, TokenBlocklist.jti)
+            .filter((TokenBlocklist.expires_at.is_(None)) | (TokenBlocklist.expires_at > now))
+            .all()
+        )
+        bloom = BloomFilter(max(MIN_CAPACITY, len(rows) * 2))
+        for _, jti in rows:
+            bloom.add(jti)
+        self._bloom = bloom
+        self._revoked = set()
+        self._last_id = max((row_id for row_id, _ in rows), default=self._last_id)
+        self._built_at = self._refreshed_at = time.monotonic()
+        self._pid = os.getpid()
+
+    def _refresh(self):
+        rows = (
+            db.session.query(TokenBlocklist.id, TokenBlocklist.jti)
+            .filter(TokenBlocklist.id > self._last_id - REFRESH_ID_WINDOW)
+            .all()
+        )
+        for row_id, jti in rows:
+            self._bloom.add(jti)
+            self._last_id = max(self._last_id, row_id)
+        self._refreshed_at = time.monotonic()
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if self._pid == os.getpid() and now - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._pid != os.getpid() or now - self._built_at >= self.rebuild_interval:
+                self._rebuild()
+            elif now - self._refreshed_at >= self.refresh_interval:
+                self._refresh()
+
+    def is_revoked(self, jti):
+        self._maybe_sync()
+        if jti not in self._bloom:
+            return False
+        if jti in self._revoked:
+            return True
+        revoked = db.session.query(TokenBlocklist.id).filter_by(jti=jti).first() is not None
+        if revoked:
+            self._revoked.add(jti)
+        return revoked
+
+    def revoke(self, jti, expires_at=None):
+        """Persist a revocation and make it visible to this worker immediately."""
+        db.session.add(TokenBlocklist(jti=jti, expires_at=expires_at))
+        db.session.commit()
+        self._maybe_sync()
+        with self._lock:
+            self._bloom.add(jti)
+            self._revoked.add(jti)
+
+
+def setup_revocation(app, jwt):
+    app.config.setdefault("BLOCKLIST_REFRESH_INTERVAL", float(os.getenv("BLOCKLIST_REFRESH_INTERVAL", DEFAULT_REFRESH_INTERVAL)))
+    app.config.setdefault("BLOCKLIST_REBUILD_INTERVAL", float(os.getenv("BLOCKLIST_REBUILD_INTERVAL", DEFAULT_REBUILD_INTERVAL)))
+    index = RevocationIndex(
+        refresh_interval=app.config["BLOCKLIST_REFRESH_INTERVAL"],
+        rebuild_interval=app.config["BLOCKLIST_REBUILD_INTERVAL"]
+    )
+    app.extensions["revocation"] = index
+
+    @jwt.token_in_blocklist_loader
+    def check_if_token_revoked(jwt_header, jwt_payload):
+        return index.is_revoked(jwt_payload["jti"])
+
+
+def get_revocation_index():
+    return current_app.extensions["revocation"]
+
+
+def purge_expired_tokens():
+    """Delete blocklist rows whose token has expired anyway. Returns the number removed."""
+    removed = TokenBlocklist.query.filter(TokenBlocklist.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
@@ -1,8 +1,29 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
-from werkzeug.security import generate_password_hash
-from api.models import db, User, Connection, FavoriteConnect, JobPosting, JobComment, JobApplication, TokenBlocklist, UserRole, Advertisement
-from datetime import datetime
+import math
+import os
+import jwt
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, redirect, url_for
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, create_access_token
+from werkzeug.security import check_password_hash, generate_password_hash
+from werkzeug.utils import safe_join
+from api.models import db, User, Company, Connection, FavoriteConnect, JobPosting, JobComment, JobApplication, UserRole, Advertisement, AdStat, UserMedia, UploadSession, Notification
+from api.pagination import keyset_page, id_page, get_page_size
+from api.loadplans import USER_SERIALIZE, USER_SERIALIZE_WITH_INTERESTS, COMPANY_SERIALIZE
+from api.projections import JOB_COLUMNS, job_row
+from api.adserving import active_ads, ads_changed, is_active_ad, serve_ads, MAX_ADS_PER_REQUEST
+from api.adstats import get_ad_stats
+from api.revocation import get_revocation_index
+from api.graph import connection_changed, get_adjacency, mutual_connections, suggest_connections, user_summaries
+from api.search import search, SEARCH_DOCUMENTS
+from api.streaming import stream_file
+from api.thumbnails import get_thumbnails, local_media_path, SIZES, FORMATS
+from api.comments import load_comment_tree, DEFAULT_MAX_DEPTH, MAX_DEPTH_LIMIT
+from api.tasks import enqueue
+from api.replicas import use_replica
+from api.events import get_events, publish, stream_events
+from api.notifications import notify, unread_count, mark_read, MAX_MARK_READ
+from api.httpcache import conditional
+from api import uploads
+from datetime import datetime, timedelta
 
 api = Blueprint('api', __name__)
 
@@ -10,10 +31,24 @@ api = Blueprint('api', __name__)
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi'}
 INSTRUCTIONAL_VIDEO_FOLDER = 'uploads/instructional_videos'
+INSTRUCTIONAL_VIDEO_ROLES = [UserRole.DISPENSARY_OWNER, UserRole.GROWER]
+VIDEO_UPLOAD_ROLES = [UserRole.CUSTOMER, UserRole.DISPENSARY_OWNER, UserRole.GROWER]
+IMAGE_UPLOAD_FOLDER = 'uploads/images'
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
 
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def enqueue_verification_email(email):
+    """Queue the verification email; it is sent by `flask run-worker` after the caller commits."""
+    secret = current_app.config.get("JWT_SECRET_KEY")
+    if not secret:
+        return
+    token = jwt.encode({"email": email, "exp": datetime.utcnow() + timedelta(hours=24)}, secret, algorithm="HS256")
+    url = url_for("api.verify_email", token=token, _external=True)
+    enqueue("send_email", priority=10, to=email, subject="Verify your GreenBizLink account",
+            body="Welcome to GreenBizLink! Confirm your email address: " + url)
+
 @api.route('/signup', methods=['POST'])
 def sign_up():
     try:
@@ -47,8 +82,9 @@ def sign_up():
             city=city if city else None
         )
         
-        # Add and commit to database
+        # Add and commit to database (the verification email is queued in the same transaction)
         db.session.add(new_user)
+        enqueue_verification_email(email)
         db.session.commit()
 
         # Create response with just the basic user data
@@ -88,7 +124,8 @@ def login():
         # Check if user exists and password is correct
         if user and check_password_hash(user.password_hash, password):
             # Create access token
-            access_token = create_access_token(identity=user.id)
+            # PyJWT requires the "sub" claim to be a string; handlers read it back with int()
+            access_token = create_access_token(identity=str(user.id))
             return jsonify({
                 "message": "Login successful",
                 "access_token": access_token
@@ -103,6 +140,62 @@ def login():
 
 
 
+# ----- USERS & COMPANIES ROUTES -----
+
+@api.route('/users', methods=['GET'])
+def get_users():
+    """Paginated user directory. ?interests=1 adds each user's interest names."""
+    include_interests = request.args.get('interests') == '1'
+    plan = USER_SERIALIZE_WITH_INTERESTS if include_interests else USER_SERIALIZE
+    users, next_cursor = id_page(
+        User.query.options(*plan), User.id,
+        cursor=request.args.get('cursor'), limit=get_page_size()
+    )
+    return jsonify({
+        "users": [user.serialize_public(include_interests=include_interests) for user in users],
+        "next_cursor": next_cursor
+    }), 200
+
+@api.route('/companies', methods=['GET'])
+def get_companies():
+    """Paginated company directory."""
+    companies, next_cursor = id_page(
+        Company.query.options(*COMPANY_SERIALIZE), Company.id,
+        cursor=request.args.get('cursor'), limit=get_page_size()
+    )
+    return jsonify({
+        "companies": [company.serialize() for company in companies],
+        "next_cursor": next_cursor
+    }), 200
+
+@api.route('/companies/<int:company_id>', methods=['GET'])
+def get_company(company_id):
+    company = Company.query.options(*COMPANY_SERIALIZE).get(company_id)
+    if not company:
+        return jsonify({"error": "Company not found"}), 404
+    return jsonify(company.serialize()), 200
+
+# ----- SEARCH ROUTES -----
+
+@api.route('/search', methods=['GET'])
+def search_all():
+    """Ranked full-text search. ?q= required; ?type=jobs|companies|users narrows it and enables ?page=."""
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+
+    kind = request.args.get('type')
+    if kind and kind not in SEARCH_DOCUMENTS:
+        return jsonify({"error": "type must be one of: " + ", ".join(SEARCH_DOCUMENTS)}), 400
+
+    limit = get_page_size()
+    page = max(1, request.args.get('page', 1, type=int))
+    results = {}
+    for name in ([kind] if kind else SEARCH_DOCUMENTS):
+        items, has_more = search(name, q, limit, page if kind else 1)
+        results[name] = {"results": items, "has_more": has_more}
+    return jsonify(results), 200
+
 # ----- FAVORITE CONNECTS ROUTES -----
 
 @api.route('/favorite-connects/<int:user_id>/add', methods=['POST'])
@@ -146,7 +239,7 @@ def delete_favorite_connect(favorite_id):
 @api.route('/connections/<int:user_id>/add', methods=['POST'])
 @jwt_required()
 def add_connection(user_id):
-    current_user_id = get_jwt_identity()
+    current_user_id = int(get_jwt_identity())
     if current_user_id == user_id:
         return jsonify({"error": "Cannot connect with yourself"}), 400
 
@@ -154,10 +247,24 @@ def add_connection(user_id):
     if existing_connection:
         return jsonify({"error": "Connection already exists"}), 400
 
+    sender = User.query.get(current_user_id)
     new_connection = Connection(user_id=current_user_id, connected_user_id=user_id, status="pending")
     db.session.add(new_connection)
+    db.session.flush()
+    notify(user_id, "connection_request", f"{sender.name} sent you a connection request.",
+           actor_id=sender.id, connection_id=new_connection.id)
     db.session.commit()
 
+    publish(user_id, "connection_request", {
+        "id": new_connection.id,
+        "user_id": sender.id,
+        "user_name": sender.name,
+        "user_role": sender.role.value,
+        "user_city": sender.city,
+        "user_state": sender.state,
+        "timestamp": new_connection.created_at.isoformat()
+    })
+
     return jsonify({"message": "Connection request sent"}), 201
 
 @api.route('/connections/<int:connection_id>/delete', methods=['DELETE'])
@@ -171,15 +278,82 @@ def delete_connection(connection_id):
 
     db.session.delete(connection)
     db.session.commit()
+    connection_changed(connection.user_id, connection.connected_user_id)
 
     return jsonify({"message": "Connection deleted successfully"}), 200
 
+@api.route('/users/<int:user_id>/connections', methods=['GET'])
+@jwt_required()
+def get_user_connections(user_id):
+    """Ids of everyone user_id is connected with (accepted connections only). Visible to user_id and their connections."""
+    current_user_id = int(get_jwt_identity())
+    connections = get_adjacency(user_id)
+    if current_user_id != user_id and current_user_id not in connections:
+        return jsonify({"error": "Unauthorized"}), 403
+    connections = sorted(connections)
+    return jsonify({"count": len(connections), "user_ids": connections}), 200
+
+@api.route('/users/<int:user_id>/mutual/<int:other_id>', methods=['GET'])
+@jwt_required()
+def get_mutual_connections(user_id, other_id):
+    """Whether two users are connected, and the connections they share. The caller must be one of the two."""
+    if int(get_jwt_identity()) not in (user_id, other_id):
+        return jsonify({"error": "Unauthorized"}), 403
+    connected, mutual = mutual_connections(user_id, other_id)
+    limit = get_page_size()
+    summaries = user_summaries(mutual[:limit])
+    return jsonify({
+        "connected": connected,
+        "count": len(mutual),
+        "users": [summaries[uid] for uid in mutual[:limit] if uid in summaries]
+    }), 200
+
+@api.route('/users/suggestions', methods=['GET'])
+@jwt_required()
+def get_connection_suggestions():
+    """People you may know: the current user's second-degree connections ranked by mutual count."""
+    suggestions = suggest_connections(int(get_jwt_identity()), limit=get_page_size())
+    summaries = user_summaries([uid for uid, _ in suggestions])
+    return jsonify([
+        dict(summaries[uid], mutual_count=count) for uid, count in suggestions if uid in summaries
+    ]), 200
+
 # ----- JOB POSTINGS ROUTES -----
 
+def filter_jobs(query):
+    """Apply the /jobs feed filters from the query string."""
+    category = request.args.get('category')
+    location = request.args.get('location')
+    company_id = request.args.get('company_id', type=int)
+    if category:
+        query = query.filter(JobPosting.category == category)
+    if location:
+        query = query.filter(JobPosting.location == location)
+    if company_id is not None:
+        query = query.filter(JobPosting.company_id == company_id)
+    return query
+
+def jobs_page_version():
+    # Job postings are never edited, so a page is fully described by its ids (an index-only scan)
+    rows, next_cursor = keyset_page(
+        filter_jobs(db.session.query(JobPosting.id, JobPosting.created_at)), JobPosting.created_at, JobPosting.id,
+        cursor=request.args.get('cursor'), limit=get_page_size()
+    )
+    return [row.id for row in rows], next_cursor
+
 @api.route('/jobs', methods=['GET'])
+@use_replica
+@conditional(jobs_page_version)
 def get_jobs():
-    jobs = JobPosting.query.all()
-    return jsonify([job.serialize() for job in jobs]), 200
+    """Newest-first job feed, keyset paginated. Filters: category, location, company_id."""
+    jobs, next_cursor = keyset_page(
+        filter_jobs(db.session.query(*JOB_COLUMNS)), JobPosting.created_at, JobPosting.id,
+        cursor=request.args.get('cursor'), limit=get_page_size()
+    )
+    return jsonify({
+        "jobs": [job_row(job) for job in jobs],
+        "next_cursor": next_cursor
+    }), 200
 
 @api.route('/job', methods=['POST'])
 @jwt_required()
@@ -218,17 +392,33 @@ def delete_job(job_id):
 
 # ----- COMMENTS ROUTES -----
 
+def job_comments_version(job_id):
+    # Any new, deleted or edited comment changes one of these
+    return tuple(db.session.query(
+        db.func.count(JobComment.id), db.func.max(JobComment.id), db.func.max(JobComment.updated_at)
+    ).filter(JobComment.job_id == job_id).one())
+
 @api.route('/job/<int:job_id>/comments', methods=['GET'])
+@use_replica
+@conditional(job_comments_version)
 def get_job_comments(job_id):
-    job = JobPosting.query.get(job_id)
-    if not job:
+    """Top-level comments (keyset paginated) with reply trees up to ?depth= levels."""
+    if not db.session.query(JobPosting.id).filter_by(id=job_id).first():
         return jsonify({"error": "Job not found"}), 404
-    return jsonify([comment.serialize() for comment in job.comments]), 200
+
+    depth = request.args.get('depth', DEFAULT_MAX_DEPTH, type=int)
+    comments, next_cursor = load_comment_tree(
+        job_id,
+        cursor=request.args.get('cursor'),
+        limit=get_page_size(),
+        max_depth=max(1, min(depth, MAX_DEPTH_LIMIT))
+    )
+    return jsonify({"comments": comments, "next_cursor": next_cursor}), 200
 
 @api.route('/job/<int:job_id>/comment', methods=['POST'])
 @jwt_required()
 def add_job_comment(job_id):
-    user_id = get_jwt_identity()
+    user_id = int(get_jwt_identity())
     data = request.get_json()
     content = data.get('content')
     parent_id = data.get('parent_id')  # Allow nested comments
@@ -243,6 +433,12 @@ def add_job_comment(job_id):
         parent_id=parent_id
     )
     db.session.add(new_comment)
+    db.session.flush()
+
+    parent = JobComment.query.get(parent_id) if parent_id else None
+    if parent:
+        notify(parent.user_id, "comment_reply", f"{new_comment.user.name} replied to your comment.",
+               actor_id=user_id, job_id=job_id, comment_id=new_comment.id, parent_id=parent.id)
     db.session.commit()
 
     return jsonify(new_comment.serialize()), 201
@@ -294,6 +490,10 @@ def update_application_status(job_id, application_id):
     if new_status not in ["pending", "accepted", "rejected"]:
         return jsonify({"error": "Invalid status"}), 400
 
+    if application.status != new_status:
+        notify(application.user_id, "application_status",
+               f"Your application for {job.title} is now {new_status}.",
+               job_id=job_id, application_id=application.id, status=new_status)
     application.status = new_status
     application.decision_notes = decision_notes
     db.session.commit()
@@ -346,6 +546,110 @@ def update_application_status(job_id, application_id):
 
 #     return jsonify(new_media.serialize()), 201
 
+# ----- CHUNKED UPLOADS ROUTES (see api/uploads.py for the protocol) -----
+
+def get_owned_upload(upload_id):
+    session = UploadSession.query.get(upload_id)
+    if not session or str(session.user_id) != str(get_jwt_identity()):
+        return None
+    return session
+
+@api.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Start a resumable upload of a video or a resume (for ?job_id)."""
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    data = request.get_json() or {}
+    kind = data.get("kind")
+    job_id = data.get("job_id")
+    if kind == "video" and user.role not in VIDEO_UPLOAD_ROLES:
+        return jsonify({"error": "You do not have permission to upload videos"}), 403
+    if kind == "resume":
+        if not job_id or not JobPosting.query.get(job_id):
+            return jsonify({"error": "A valid job_id is required for resumes"}), 400
+
+    session = uploads.create_session(user.id, kind, data.get("file_name"), data.get("size"),
+                                     job_id=job_id if kind == "resume" else None)
+    return jsonify(dict(session.serialize(), chunk_size=uploads.CHUNK_SIZE)), 201
+
+@api.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    """Current offset, so an interrupted client knows where to resume."""
+    session = get_owned_upload(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(session.serialize()), 200
+
+@api.route('/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def append_upload_chunk(upload_id):
+    """Append one chunk: raw body, Upload-Offset and X-Chunk-SHA256 headers."""
+    session = get_owned_upload(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header is required"}), 400
+
+    new_offset = uploads.append_chunk(session, offset, request.headers.get("X-Chunk-SHA256"),
+                                      request.stream, request.content_length)
+    return jsonify({"upload_id": session.id, "offset": new_offset}), 200
+
+@api.route('/uploads/<upload_id>/commit', methods=['POST'])
+@jwt_required()
+def commit_upload(upload_id):
+    """Finish the upload and create the UserMedia or JobApplication it was for."""
+    session = get_owned_upload(upload_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    user = User.query.get(session.user_id)
+
+    if session.kind == "video":
+        instructional = user.role in INSTRUCTIONAL_VIDEO_ROLES
+        target_directory = INSTRUCTIONAL_VIDEO_FOLDER if instructional else os.path.join(current_app.config['UPLOAD_FOLDER'], 'videos')
+        file_path = uploads.finish_session(session, target_directory)
+        record = UserMedia(
+            user_id=user.id,
+            company_id=user.company_id,
+            file_name=os.path.basename(file_path),
+            file_type='video',
+            file_path=file_path,
+            instructional=instructional
+        )
+    else:
+        job = JobPosting.query.get(session.job_id)
+        if not job:
+            # Deleted since the upload started; it can never be committed, so drop it before moving anything
+            uploads.discard_session(session)
+            return jsonify({"error": "Job not found"}), 404
+        file_path = uploads.finish_session(session, os.path.join(current_app.config['UPLOAD_FOLDER'], 'resumes'))
+        record = JobApplication(
+            user_id=user.id,
+            job_id=job.id,
+            company_id=job.company_id,
+            resume_file_path=file_path
+        )
+    db.session.add(record)
+    db.session.commit()
+
+    return jsonify(record.serialize()), 201
+
+@api.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    session = get_owned_upload(upload_id)
+    if not session or session.status != "open":
+        return jsonify({"error": "Upload not found"}), 404
+    uploads.discard_session(session)
+    return jsonify({"message": "Upload aborted"}), 200
+
+
 @api.route('/stream/video/<filename>', methods=['GET'])
 @jwt_required()
 def stream_video(filename):
@@ -353,32 +657,97 @@ def stream_video(filename):
     user = User.query.get(current_user_id)
 
     # Check if it’s an instructional video and verify access
-    instructional_video_path = os.path.join(INSTRUCTIONAL_VIDEO_FOLDER, filename)
-    if os.path.exists(instructional_video_path):
-        if user.role not in [UserRole.DISPENSARY_OWNER, UserRole.GROWER, UserRole.SEEDBANK_OWNER]:
+    instructional_video_path = safe_join(INSTRUCTIONAL_VIDEO_FOLDER, filename)
+    if instructional_video_path and os.path.isfile(instructional_video_path):
+        if not user or user.role not in INSTRUCTIONAL_VIDEO_ROLES:
             return jsonify({"error": "You do not have access to instructional videos"}), 403
         video_path = instructional_video_path
     else:
-        video_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'videos', filename)
+        video_path = safe_join(current_app.config['UPLOAD_FOLDER'], 'videos', filename)
 
     # Check if video exists
-    if not os.path.exists(video_path):
+    if not video_path or not os.path.isfile(video_path):
         return jsonify({"error": "Video not found"}), 404
 
-    return partial_response(video_path)
+    return stream_file(video_path)
 
 
 @api.route('/images/<filename>', methods=['GET'])
 @jwt_required()
 def get_image(filename):
-    image_path = os.path.join(IMAGE_UPLOAD_FOLDER, filename)
+    image_path = safe_join(IMAGE_UPLOAD_FOLDER, filename)
 
-    if not os.path.exists(image_path):
+    if not image_path or not os.path.exists(image_path):
         return jsonify({"error": "Image not found"}), 404
 
     return send_file(image_path)
 
 
+def thumbnail_response(source):
+    """Redirect to the immutable derivative URL, or serve the original if it isn't rendered yet."""
+    size = request.args.get("size", "thumb")
+    if size not in SIZES:
+        return jsonify({"error": "size must be one of: " + ", ".join(SIZES)}), 400
+    fmt = request.args.get("format") or ("webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg")
+    if fmt not in FORMATS:
+        return jsonify({"error": "format must be one of: " + ", ".join(FORMATS)}), 400
+
+    key = get_thumbnails().get_or_render(source, size, fmt)
+    if key is None:
+        response = send_file(source, max_age=0)
+    else:
+        response = redirect(url_for("api.get_thumbnail", key=key, fmt=fmt))
+        response.cache_control.max_age = 300
+    response.vary.add("Accept")
+    return response
+
+
+@api.route('/images/<filename>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_image_thumbnail(filename):
+    image_path = safe_join(IMAGE_UPLOAD_FOLDER, filename)
+    if not image_path or not os.path.isfile(image_path):
+        return jsonify({"error": "Image not found"}), 404
+    return thumbnail_response(image_path)
+
+
+@api.route('/users/<int:user_id>/profile-image/thumbnail', methods=['GET'])
+def get_profile_image_thumbnail(user_id):
+    profile_image = db.session.query(User.profile_image).filter_by(id=user_id).scalar()
+    if profile_image and "://" in profile_image:
+        return redirect(profile_image)
+    source = local_media_path(profile_image)
+    if not source:
+        return jsonify({"error": "Image not found"}), 404
+    return thumbnail_response(source)
+
+
+@api.route('/companies/<int:company_id>/logo/thumbnail', methods=['GET'])
+def get_company_logo_thumbnail(company_id):
+    logo = db.session.query(Company.logo).filter_by(id=company_id).scalar()
+    if logo and "://" in logo:
+        return redirect(logo)
+    source = local_media_path(logo)
+    if not source:
+        return jsonify({"error": "Image not found"}), 404
+    return thumbnail_response(source)
+
+
+@api.route('/thumbnails/<key>.<fmt>', methods=['GET'])
+def get_thumbnail(key, fmt):
+    """Derivatives are keyed by source version, so they never change and can be cached forever."""
+    if fmt not in FORMATS or len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+        return jsonify({"error": "Thumbnail not found"}), 404
+    path = get_thumbnails().path_for(key, fmt)
+    if not os.path.isfile(path):
+        return jsonify({"error": "Thumbnail not found"}), 404
+
+    response = send_file(path, mimetype=FORMATS[fmt], max_age=THUMBNAIL_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @api.route('/companies/<int:company_id>/jobs', methods=['POST'])
 @jwt_required()
 def post_job(company_id):
@@ -420,10 +789,15 @@ def post_job(company_id):
 
     return jsonify({"message": "Job posted successfully", "job": new_job.serialize()}), 201  
 
+def company_jobs_version(company_id):
+    return [job_id for (job_id,) in db.session.query(JobPosting.id).filter_by(company_id=company_id).order_by(JobPosting.id)]
+
 @api.route('/companies/<int:company_id>/jobs', methods=['GET'])
+@use_replica
+@conditional(company_jobs_version)
 def get_company_jobs(company_id):
-    jobs = JobPosting.query.filter_by(company_id=company_id).all()
-    return jsonify([job.serialize() for job in jobs])
+    jobs = db.session.query(*JOB_COLUMNS).filter(JobPosting.company_id == company_id).all()
+    return jsonify([job_row(job) for job in jobs])
 
 
 # authentification
@@ -565,15 +939,15 @@ def get_company_jobs(company_id):
 @api.route("/logout", methods=["POST"])
 @jwt_required(refresh=True)  # Requires refresh token to log out
 def logout():
-    jti = get_jwt()["jti"]  # Get JWT Token ID
-    db.session.add(TokenBlocklist(jti=jti))  # Add to blocklist
-    db.session.commit()
+    token = get_jwt()
+    # Add to blocklist; keep the token's expiry so the row can be purged once it's useless
+    get_revocation_index().revoke(token["jti"], expires_at=datetime.utcfromtimestamp(token["exp"]) if "exp" in token else None)
     return jsonify({"message": "Logged out successfully"}), 200
 
 @api.route("/verify-email/<token>", methods=["GET"])
 def verify_email(token):
     try:
-        decoded_data = jwt.decode(token, app.config["JWT_SECRET_KEY"], algorithms=["HS256"])
+        decoded_data = jwt.decode(token, current_app.config["JWT_SECRET_KEY"], algorithms=["HS256"])
         user_email = decoded_data["email"]
         user = User.query.filter_by(email=user_email).first()
 
@@ -604,7 +978,7 @@ def refresh():
 @jwt_required()
 def get_pending_requests():
     """Fetch all connection requests received by the user that are pending."""
-    current_user_id = get_jwt_identity()["id"]
+    current_user_id = int(get_jwt_identity())
 
     pending_requests = Connection.query.filter_by(connected_user_id=current_user_id, status="pending").all()
 
@@ -630,32 +1004,88 @@ def update_connection_status(connection_id):
     connection = Connection.query.get(connection_id)
     if not connection:
         return jsonify({"error": "Connection request not found"}), 404
+    if int(get_jwt_identity()) != connection.connected_user_id:
+        return jsonify({"error": "Unauthorized"}), 403
 
+    if new_status == "connected" and connection.status != "connected":
+        notify(connection.user_id, "connection_accepted",
+               f"{connection.connected_user.name} accepted your connection request.",
+               actor_id=connection.connected_user_id, connection_id=connection.id)
     connection.status = new_status
     db.session.commit()
+    connection_changed(connection.user_id, connection.connected_user_id)
+    publish(connection.user_id, "connection_status", {
+        "id": connection.id,
+        "user_id": connection.connected_user_id,
+        "status": new_status
+    })
 
     return jsonify({"message": f"Connection request {new_status}."}), 200
 
 
+@api.route("/events/stream", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])
+def event_stream():
+    """Server-Sent Events for the current user (see api/events.py). EventSource can't set headers, so ?jwt= is accepted."""
+    user_id = int(get_jwt_identity())
+    return Response(stream_events(get_events(), user_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@api.route("/notifications", methods=["GET"])
 @api.route("/users/notifications", methods=["GET"])
 @jwt_required()
 def get_notifications():
-    """Fetch notifications for connection requests."""
-    current_user_id = get_jwt_identity()["id"]
+    """The current user's notification inbox, newest first. ?unread=1 lists unread only."""
+    current_user_id = int(get_jwt_identity())
 
-    notifications = Connection.query.filter_by(connected_user_id=current_user_id, status="pending").all()
+    # Read from the primary: a lagging replica would show notifications just marked read as unread
+    notifications_query = Notification.query.filter_by(user_id=current_user_id)
+    if request.args.get("unread") in ("1", "true"):
+        notifications_query = notifications_query.filter(Notification.read_at.is_(None))
+    notifications, next_cursor = keyset_page(notifications_query, Notification.created_at, Notification.id,
+                                             cursor=request.args.get("cursor"), limit=get_page_size())
 
-    return jsonify([{
-        "message": f"{conn.user.name} sent you a connection request.",
-        "timestamp": conn.created_at.isoformat()
-    } for conn in notifications]), 200
+    return jsonify({
+        "notifications": [n.serialize() for n in notifications],
+        "next_cursor": next_cursor,
+        "unread_count": unread_count(current_user_id)
+    }), 200
+
+
+@api.route("/notifications/unread-count", methods=["GET"])
+@jwt_required()
+def get_unread_notification_count():
+    """Badge count, served from the cache."""
+    return jsonify({"unread_count": unread_count(int(get_jwt_identity()))}), 200
+
+
+@api.route("/notifications/read", methods=["POST"])
+@jwt_required()
+def mark_notifications_read():
+    """Mark notifications read: {"ids": [...]} for specific ones, {"all": true} for the whole inbox."""
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+
+    if data.get("all"):
+        ids = None
+    else:
+        ids = data.get("ids")
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids must be a list of notification ids, or pass all: true"}), 400
+        if len(ids) > MAX_MARK_READ:
+            return jsonify({"error": f"At most {MAX_MARK_READ} ids per request"}), 400
+
+    updated = mark_read(current_user_id, ids)
+    return jsonify({"updated": updated, "unread_count": unread_count(current_user_id)}), 200
 
 
 @api.route("/users/favorites", methods=["GET"])
 @jwt_required()
+@use_replica
 def get_favorite_users():
     """Fetch all favorited users."""
-    current_user_id = get_jwt_identity()["id"]
+    current_user_id = int(get_jwt_identity())
 
     favorites = FavoriteConnect.query.filter_by(user_id=current_user_id).all()
 
@@ -672,31 +1102,94 @@ def get_favorite_users():
 
 @api.route("/ads", methods=["GET"])
 def get_ads():
-    """Fetch all active advertisements."""
-    ads = Advertisement.query.filter_by(active=True).all()
-    return jsonify([ad.serialize() for ad in ads]), 200
+    """Fetch all active advertisements (cached; invalidated by create_ad and toggle_ad_status)."""
+    # Not @use_replica: a refill from a lagging replica would cache the pre-change list for a full TTL
+    return jsonify(active_ads()), 200
+
+
+@api.route("/ads/serve", methods=["GET"])
+def serve_ad_slots():
+    """Pick ?n= active ads (default 1), weighted by Advertisement.weight."""
+    n = request.args.get("n", 1, type=int)
+    return jsonify(serve_ads(max(1, min(n, MAX_ADS_PER_REQUEST)))), 200
+
+
+@api.route("/ads/<int:ad_id>/impression", methods=["POST"])
+def record_ad_impression(ad_id):
+    """Count one impression. Buffered in memory; visible in reports after the next flush."""
+    if not is_active_ad(ad_id):
+        return jsonify({"error": "Ad not found"}), 404
+    get_ad_stats().record(ad_id, impressions=1)
+    return "", 204
+
+
+@api.route("/ads/<int:ad_id>/click", methods=["POST"])
+def record_ad_click(ad_id):
+    """Count one click. Buffered in memory; visible in reports after the next flush."""
+    if not is_active_ad(ad_id):
+        return jsonify({"error": "Ad not found"}), 404
+    get_ad_stats().record(ad_id, clicks=1)
+    return "", 204
+
+
+@api.route("/companies/<int:company_id>/ads/report", methods=["GET"])
+@jwt_required()
+def get_ad_report(company_id):
+    """Daily impressions/clicks for a company's ads over the last ?days= days (default 30)."""
+    current_user_id = int(get_jwt_identity())
+    user = User.query.get(current_user_id)
+
+    if not user or (user.company_id != company_id and user.role != UserRole.ADMIN):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    days = max(1, min(request.args.get("days", 30, type=int), 365))
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    stats = (
+        AdStat.query
+        .join(Advertisement, AdStat.ad_id == Advertisement.id)
+        .filter(Advertisement.company_id == company_id, AdStat.day >= since)
+        .order_by(AdStat.day, AdStat.ad_id)
+        .all()
+    )
+    return jsonify({
+        "since": since.isoformat(),
+        "impressions": sum(stat.impressions for stat in stats),
+        "clicks": sum(stat.clicks for stat in stats),
+        "days": [stat.serialize() for stat in stats]
+    }), 200
 
 
 @api.route("/ads", methods=["POST"])
 @jwt_required()
 def create_ad():
     """Allow companies to create advertisements."""
-    current_user_id = get_jwt_identity()["id"]
+    current_user_id = int(get_jwt_identity())
     user = User.query.get(current_user_id)
 
     if not user or not user.company_id:
         return jsonify({"error": "Only companies can create ads"}), 403
 
     data = request.get_json()
+    if not data or not data.get("title") or not data.get("description") or not data.get("link"):
+        return jsonify({"error": "Title, description, and link are required"}), 400
+    try:
+        weight = float(data.get("weight", 1.0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "weight must be a number"}), 400
+    if not math.isfinite(weight) or weight < 0:
+        return jsonify({"error": "weight must be a finite, non-negative number"}), 400
+
     new_ad = Advertisement(
         company_id=user.company_id,
         title=data.get("title"),
         description=data.get("description"),
         image_url=data.get("image_url"),
-        link=data.get("link")
+        link=data.get("link"),
+        weight=weight
     )
     db.session.add(new_ad)
     db.session.commit()
+    ads_changed()
 
     return jsonify(new_ad.serialize()), 201
 
@@ -705,7 +1198,7 @@ def create_ad():
 @jwt_required()
 def toggle_ad_status(ad_id):
     """Allow an admin to activate/deactivate an ad."""
-    current_user_id = get_jwt_identity()["id"]
+    current_user_id = int(get_jwt_identity())
     user = User.query.get(current_user_id)
 
     if not user or user.role != UserRole.ADMIN:
@@ -717,5 +1210,6 @@ def toggle_ad_status(ad_id):
 
     ad.active = not ad.active  # Toggle status
     db.session.commit()
+    ads_changed()
 
     return jsonify({"message": f"Ad {'activated' if ad.active else 'deactivated'}"}), 200
@@ -0,0 +1,95 @@
+"""
+Ranked full-text search over jobs, companies and users.
+
+PostgreSQL: GIN expression indexes on the weighted to_tsvector() expressions
+below; Postgres keeps them current on every write. SQLite (local runs):
+external-content FTS5 tables kept in sync by triggers. Both are created by
+the search migration, and the expressions there must match SEARCH_DOCUMENTS
+exactly or Postgres will not use the index.
+"""
+from sqlalchemy import text
+from api.models import db, JobPosting, Company, User
+from api.loadplans import USER_SERIALIZE, COMPANY_SERIALIZE
+from api.utils import APIException
+
+MAX_OFFSET = 1000
+
+# kind -> (model, table, postgres tsvector expression, fts5 table, fts5 bm25 column weights)
+SEARCH_DOCUMENTS = {
+    "jobs": (
+        JobPosting, "job_posting",
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(category, '') || ' ' || coalesce(location, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')",
+        "job_posting_fts", "10.0, 5.0, 5.0, 1.0",  # title, category, location, description
+    ),
+    "companies": (
+        Company, "company",
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(industry, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')",
+        "company_fts", "10.0, 5.0, 1.0",  # name, industry, description
+    ),
+    "users": (
+        User, "user",
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(city, '') || ' ' || coalesce(state, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(bio, '')), 'C')",
+        "user_fts", "10.0, 5.0, 5.0, 1.0",  # name, city, state, bio
+    ),
+}
+
+SERIALIZE_PLANS = {"jobs": (), "companies": COMPANY_SERIALIZE, "users": USER_SERIALIZE}
+# Search is unauthenticated: users get the public serialization (no email)
+SERIALIZERS = {"jobs": JobPosting.serialize, "companies": Company.serialize, "users": User.serialize_public}
+
+
+def _fts5_query(q):
+    # Quote every term so user input can't trip FTS5 query syntax; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def _ranked_ids(kind, q, limit, offset):
+    model, table, tsvector, fts_table, bm25_weights = SEARCH_DOCUMENTS[kind]
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        sql = text(
+            'SELECT id FROM "{table}", websearch_to_tsquery(\'english\', :q) AS query '
+            'WHERE ({tsvector}) @@ query '
+            'ORDER BY ts_rank({tsvector}, query) DESC, id DESC LIMIT :limit OFFSET :offset'.format(table=table, tsvector=tsvector)
+        )
+        params = {"q": q, "limit": limit, "offset": offset}
+    elif dialect == "sqlite":
+        sql = text(
+            "SELECT rowid FROM {fts} WHERE {fts} MATCH :q "
+            "ORDER BY bm25({fts}, {weights}) LIMIT :limit OFFSET :offset".format(fts=fts_table, weights=bm25_weights)
+        )
+        params = {"q": _fts5_query(q), "limit": limit, "offset": offset}
+    else:
+        raise APIException("Search is not supported on " + dialect, status_code=501)
+    try:
+        return [row[0] for row in db.session.execute(sql, params)]
+    except Exception as e:
+        db.session.rollback()
+        if dialect == "sqlite" and "no such table" in str(e):
+            raise APIException("Search index missing; run `flask db upgrade`", status_code=503)
+        raise
+
+
+def search(kind, q, limit, page=1):
+    """One page of ranked, serialized results. Returns (items, has_more)."""
+    offset = (page - 1) * limit
+    if offset > MAX_OFFSET:
+        raise APIException("Page too deep; refine the search", status_code=400)
+
+    ids = _ranked_ids(kind, q, limit + 1, offset)
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    if not ids:
+        return [], has_more
+
+    model = SEARCH_DOCUMENTS[kind][0]
+    rows = model.query.options(*SERIALIZE_PLANS[kind]).filter(model.id.in_(ids)).all()
+    by_id = {row.id: row for row in rows}
+    serialize = SERIALIZERS[kind]
+    return [serialize(by_id[i]) for i in ids if i in by_id], has_more
@@ -0,0 +1,205 @@
+"""
+Deterministic bulk data generator for load testing (`flask seed`).
+
+Rows are produced lazily and written in batches: COPY ... FROM STDIN on
+Postgres (psycopg2), executemany elsewhere. Memory stays flat at millions of
+rows. Primary keys are assigned here, starting after the current max id, so
+child tables can reference parents without reading anything back; Postgres
+sequences are moved past them at the end. The same --seed always produces
+the same dataset.
+"""
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+from api.models import (db, User, Company, Connection, FavoriteConnect, JobPosting, JobComment,
+                        JobApplication, Advertisement, UserRole)
+
+FIRST_NAMES = ["Maria", "James", "Ana", "Luis", "Emily", "Jamal", "Sofia", "Chen", "Olivia", "Noah", "Priya",
+               "Diego", "Hannah", "Kwame", "Grace", "Mateo", "Aisha", "Ethan", "Yuki", "Isabella"]
+LAST_NAMES = ["Garcia", "Smith", "Nguyen", "Johnson", "Patel", "Brown", "Lopez", "Kim", "Williams", "Davis",
+              "Martinez", "Okafor", "Wilson", "Chen", "Anderson", "Silva", "Taylor", "Moore", "Rivera", "Cohen"]
+LOCATIONS = [("Denver", "CO"), ("Boulder", "CO"), ("Seattle", "WA"), ("Portland", "OR"), ("Los Angeles", "CA"),
+             ("Oakland", "CA"), ("Las Vegas", "NV"), ("Phoenix", "AZ"), ("Detroit", "MI"), ("Chicago", "IL"),
+             ("Boston", "MA"), ("Albuquerque", "NM"), ("New York", "NY"), ("Anchorage", "AK")]
+INDUSTRIES = ["Grower", "Dispensary", "Extraction Lab", "Testing Lab", "Distributor", "Legal Services", "Marketing"]
+JOB_CATEGORIES = ["Budtender", "Grower", "Trimmer", "Extraction Technician", "Dispensary Manager",
+                  "Compliance Officer", "Delivery Driver", "Marketing"]
+SEED_EMAIL = "seed_user%d@example.com"
+SEED_PASSWORD = "password123"  # every seeded user shares it, so `flask benchmark` can log in as any of them
+JOB_ADJECTIVES = ["Senior", "Junior", "Lead", "Part-time", "Full-time", "Assistant"]
+WORDS = ("cultivation harvest compliance customer inventory strain terpene retail license extraction "
+         "greenhouse packaging delivery team growth quality product testing training shift schedule").split()
+USER_ROLES = [UserRole.CUSTOMER] * 6 + [UserRole.BUDTENDER, UserRole.GROWER, UserRole.DISPENSARY_OWNER,
+                                        UserRole.LEGAL_ADVISOR, UserRole.OTHER]
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _timestamp(rng, start, days=365):
+    return start + timedelta(seconds=rng.randrange(days * 24 * 3600))
+
+
+def _next_id(conn, table):
+    return (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _copy_value(value):
+    if isinstance(value, UserRole):
+        return value.name
+    return value
+
+
+def _write_batch(conn, table, columns, batch):
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([_copy_value(row[c]) for c in columns])
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert('COPY "%s" (%s) FROM STDIN WITH (FORMAT csv)' % (table.name, ", ".join(columns)), buffer)
+    else:
+        conn.execute(table.insert(), batch)
+
+
+def bulk_insert(conn, model, rows, batch_size):
+    """Stream rows (dicts with the same keys) into model's table in batches. Returns the count."""
+    table = model.__table__
+    batch, columns, total = [], None, 0
+    for row in rows:
+        columns = columns or list(row)
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _write_batch(conn, table, columns, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        _write_batch(conn, table, columns, batch)
+        total += len(batch)
+    return total
+
+
+def seed_database(users=1000, companies=None, connections_per_user=10, favorites_per_user=2,
+                  jobs_per_company=5, comments_per_job=4, applications_per_job=3, ads_per_company=1,
+                  seed=42, batch_size=5000, log=print):
+    companies = companies if companies is not None else max(1, users // 20)
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    password_hash = generate_password_hash(SEED_PASSWORD)  # hashing is slow, so it is done once
+
+    with db.engine.begin() as conn:
+        ids = {model: _next_id(conn, model.__table__) for model in
+               (Company, User, Connection, FavoriteConnect, JobPosting, JobComment, JobApplication, Advertisement)}
+        company_ids = range(ids[Company], ids[Company] + companies)
+        user_ids = range(ids[User], ids[User] + users)
+
+        def company_rows():
+            for company_id in company_ids:
+                city, state = rng.choice(LOCATIONS)
+                industry = rng.choice(INDUSTRIES)
+                yield {"id": company_id, "name": "%s %s %s #%d" % (rng.choice(LAST_NAMES), city, industry, company_id),
+                       "industry": industry, "company_size": rng.choice(["Small", "Medium", "Large"]),
+                       "location": "%s, %s" % (city, state), "website": "https://company%d.example.com" % company_id,
+                       "phone": None, "email": "info@company%d.example.com" % company_id, "social_links": None,
+                       "founded_year": rng.randint(1995, 2024), "verified": rng.random() < 0.3, "logo": None,
+                       "description": _sentence(rng, 25)}
+
+        def user_rows():
+            for user_id in user_ids:
+                city, state = rng.choice(LOCATIONS)
+                role = rng.choice(USER_ROLES)
+                employed = role != UserRole.CUSTOMER and rng.random() < 0.7
+                yield {"id": user_id, "name": "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)),
+                       "email": SEED_EMAIL % user_id, "password_hash": password_hash,
+                       "bio": _sentence(rng, 15), "role": role, "city": city, "state": state, "profile_image": None,
+                       "company_id": rng.choice(company_ids) if employed else None, "is_verified": rng.random() < 0.8,
+                       "last_login": _timestamp(rng, start)}
+
+        def pair_rows(model, per_user, other_column, extra):
+            next_id = ids[model]
+            for user_id in user_ids:
+                others = set()
+                for _ in range(min(per_user, users - 1)):
+                    other = rng.choice(user_ids)
+                    if other != user_id and other not in others:
+                        others.add(other)
+                        row = {"id": next_id, "user_id": user_id, other_column: other}
+                        row.update(extra())
+                        yield row
+                        next_id += 1
+
+        job_ids = range(ids[JobPosting], ids[JobPosting] + companies * jobs_per_company)
+
+        def job_rows():
+            job_id = ids[JobPosting]
+            for company_id in company_ids:
+                for _ in range(jobs_per_company):
+                    category = rng.choice(JOB_CATEGORIES)
+                    city, state = rng.choice(LOCATIONS)
+                    yield {"id": job_id, "title": "%s %s" % (rng.choice(JOB_ADJECTIVES), category), "category": category,
+                           "description": _sentence(rng, 40), "location": "%s, %s" % (city, state),
+                           "salary": "$%d/hr" % rng.randint(15, 45), "posted_by": rng.choice(user_ids),
+                           "company_id": company_id, "created_at": _timestamp(rng, start)}
+                    job_id += 1
+
+        def comment_rows():
+            comment_id = ids[JobComment]
+            for job_id in job_ids:
+                thread = []
+                for _ in range(comments_per_job):
+                    created = _timestamp(rng, start)
+                    # Roughly half are replies to an earlier comment in the same thread
+                    parent = rng.choice(thread) if thread and rng.random() < 0.5 else None
+                    yield {"id": comment_id, "job_id": job_id, "user_id": rng.choice(user_ids), "company_id": None,
+                           "content": _sentence(rng), "created_at": created, "updated_at": created, "parent_id": parent}
+                    thread.append(comment_id)
+                    comment_id += 1
+
+        def application_rows():
+            application_id = ids[JobApplication]
+            for index, job_id in enumerate(job_ids):
+                company_id = company_ids[index // jobs_per_company]
+                for _ in range(applications_per_job):
+                    status = rng.choice(["pending", "pending", "accepted", "rejected"])
+                    yield {"id": application_id, "user_id": rng.choice(user_ids), "job_id": job_id,
+                           "company_id": company_id, "applied_at": _timestamp(rng, start), "status": status,
+                           "resume_file_path": None, "decision_notes": None if status == "pending" else _sentence(rng, 8)}
+                    application_id += 1
+
+        def ad_rows():
+            ad_id = ids[Advertisement]
+            for company_id in company_ids:
+                for _ in range(ads_per_company):
+                    yield {"id": ad_id, "company_id": company_id, "title": _sentence(rng, 4),
+                           "description": _sentence(rng, 20), "image_url": None,
+                           "link": "https://company%d.example.com/promo" % company_id,
+                           "created_at": _timestamp(rng, start), "active": rng.random() < 0.6,
+                           "weight": float(rng.choice([1, 1, 2, 5]))}
+                    ad_id += 1
+
+        plan = [
+            (Company, company_rows()),
+            (User, user_rows()),
+            (Connection, pair_rows(Connection, connections_per_user, "connected_user_id", lambda: {
+                "status": rng.choice(["connected", "connected", "connected", "pending", "rejected"]),
+                "created_at": _timestamp(rng, start)})),
+            (FavoriteConnect, pair_rows(FavoriteConnect, favorites_per_user, "favorite_user_id", lambda: {
+                "created_at": _timestamp(rng, start)})),
+            (JobPosting, job_rows()),
+            (JobComment, comment_rows()),
+            (JobApplication, application_rows()),
+            (Advertisement, ad_rows()),
+        ]
+        for model, rows in plan:
+            log("%s: %d rows" % (model.__tablename__, bulk_insert(conn, model, rows, batch_size)))
+
+        if conn.dialect.name == "postgresql":
+            for model, _ in plan:
+                conn.exec_driver_sql(
+                    "SELECT setval(pg_get_serial_sequence('\"%s\"', 'id'), (SELECT MAX(id) FROM \"%s\"))"
+                    % (model.__tablename__, model.__tablename__))
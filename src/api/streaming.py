@@ -0,0 +1,118 @@
+"""
+HTTP range streaming for media files.
+
+Worker memory stays flat whatever the file size, because the file is never
+read into Python as a whole:
+- With MEDIA_ACCEL_PREFIX set, nginx serves the file through X-Accel-Redirect
+  (it handles Range itself) and the worker only checks access.
+- Under gunicorn, the file is seeked to the range start and handed over as
+  wsgi.file_wrapper. Gunicorn then sends exactly Content-Length bytes from
+  that offset with sendfile(2).
+- Anywhere else, the range is streamed in CHUNK_SIZE os.pread() chunks.
+"""
+import mimetypes
+import os
+from flask import Response, current_app, request
+from werkzeug.http import http_date
+
+CHUNK_SIZE = 256 * 1024
+
+
+class FileRangeIterator:
+    """Yields bytes [start, start + length) of a file, one chunk at a time."""
+
+    def __init__(self, path, start, length):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.offset = start
+        self.remaining = length
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining <= 0:
+            raise StopIteration
+        chunk = os.pread(self.fd, min(CHUNK_SIZE, self.remaining), self.offset)
+        if not chunk:
+            raise StopIteration
+        self.offset += len(chunk)
+        self.remaining -= len(chunk)
+        return chunk
+
+    def close(self):
+        os.close(self.fd)
+
+
+def file_etag(st):
+    """Strong validator: changes whenever the file is replaced or rewritten."""
+    return "%x-%x" % (st.st_mtime_ns, st.st_size)
+
+
+def _not_modified(etag, mtime):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    return request.if_modified_since is not None and int(mtime) <= request.if_modified_since.timestamp()
+
+
+def _range_still_valid(etag, mtime):
+    """If-Range: honor Range only if the client's copy is still current."""
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    if if_range.date is not None:
+        return int(mtime) <= if_range.date.timestamp()
+    return True
+
+
+def _body(path, start, length):
+    environ = request.environ
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    if file_wrapper and environ.get("SERVER_SOFTWARE", "").startswith("gunicorn"):
+        f = open(path, "rb")
+        f.seek(start)
+        return file_wrapper(f, CHUNK_SIZE)
+    return FileRangeIterator(path, start, length)
+
+
+def stream_file(path, mimetype=None, max_age=3600):
+    """Response for path honoring Range, If-Range, If-None-Match and If-Modified-Since."""
+    st = os.stat(path)
+    size = st.st_size
+    etag = file_etag(st)
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": '"%s"' % etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": "private, max-age=%d" % max_age,
+    }
+
+    if _not_modified(etag, st.st_mtime):
+        return Response(status=304, headers=headers)
+
+    accel_prefix = current_app.config.get("MEDIA_ACCEL_PREFIX")
+    media_root = current_app.config.get("UPLOAD_FOLDER")
+    if accel_prefix and media_root:
+        relative = os.path.relpath(os.path.realpath(path), os.path.realpath(media_root))
+        if not relative.startswith(".."):
+            headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + relative
+            return Response(status=200, headers=headers, mimetype=mimetype)
+
+    start, length, status = 0, size, 200
+    byte_range = request.range
+    if byte_range is not None and len(byte_range.ranges) == 1 and _range_still_valid(etag, st.st_mtime):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers["Content-Range"] = "bytes */%d" % size
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        length = stop - start
+        status = 206
+        headers["Content-Range"] = "bytes %d-%d/%d" % (start, stop - 1, size)
+
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status=status, headers=headers, mimetype=mimetype)
+    return Response(_body(path, start, length), status=status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,197 @@
+"""
+Database-backed background task queue.
+
+Request handlers enqueue() work and return. The Task row is added to the
+caller's session, so it commits (or rolls back) together with the caller's
+own changes. `flask run-worker` processes claim runnable tasks:
+- Tasks run highest priority first, then oldest first.
+- Each claim sets a visibility timeout. A task whose worker died becomes
+  claimable again once locked_until passes.
+- Failures are retried with exponential backoff until max_attempts.
+
+Claiming is an optimistic UPDATE ... WHERE status/locked_until still match,
+so two workers can never both win a task. On Postgres, candidates are also
+selected FOR UPDATE SKIP LOCKED so workers don't contend for the same rows.
+"""
+import json
+import logging
+import os
+import smtplib
+import time
+import traceback
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from multiprocessing import Process
+from flask import has_app_context
+from sqlalchemy import and_, event, or_
+from api.models import db, Task, User, Company
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_POLL_INTERVAL = 1.0
+MAX_BACKOFF = 3600
+
+_handlers = {}
+
+
+def task(name, max_attempts=5, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+    """Register a handler; it is called with the payload's keys as keyword arguments."""
+    def register(fn):
+        _handlers[name] = (fn, max_attempts, visibility_timeout)
+        return fn
+    return register
+
+
+def enqueue(name, priority=0, delay=0, **payload):
+    """Queue a task in the current session; it becomes visible when the caller commits."""
+    if name not in _handlers:
+        raise ValueError("Unknown task: " + name)
+    new_task = Task(
+        name=name,
+        payload=json.dumps(payload),
+        priority=priority,
+        max_attempts=_handlers[name][1],
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(new_task)
+    return new_task
+
+
+def _runnable(now):
+    return or_(
+        and_(Task.status == "queued", Task.run_after <= now),
+        and_(Task.status == "running", Task.locked_until < now),
+    )
+
+
+def claim_next():
+    """Claim one runnable task for this worker, or return None."""
+    now = datetime.utcnow()
+    candidates = (
+        db.session.query(Task.id)
+        .filter(_runnable(now))
+        .order_by(Task.priority.desc(), Task.id)
+        .limit(10)
+    )
+    if db.engine.dialect.name == "postgresql":
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    for (task_id,) in candidates.all():
+        row = Task.query.get(task_id)
+        timeout = _handlers.get(row.name, (None, None, DEFAULT_VISIBILITY_TIMEOUT))[2]
+        claimed = (
+            Task.query
+            .filter(Task.id == task_id, _runnable(now))
+            .update({
+                Task.status: "running",
+                Task.locked_until: now + timedelta(seconds=timeout),
+                Task.attempts: Task.attempts + 1,
+            }, synchronize_session=False)
+        )
+        db.session.commit()
+        if claimed:
+            db.session.refresh(row)
+            return row
+    db.session.commit()
+    return None
+
+
+def run_task(claimed):
+    handler = _handlers.get(claimed.name)
+    try:
+        if handler is None:
+            raise LookupError("No handler registered for task " + claimed.name)
+        handler[0](**json.loads(claimed.payload))
+    except Exception:
+        db.session.rollback()
+        claimed = Task.query.get(claimed.id)
+        claimed.last_error = traceback.format_exc()[-4000:]
+        claimed.locked_until = None
+        if claimed.attempts >= claimed.max_attempts:
+            claimed.status = "failed"
+            claimed.finished_at = datetime.utcnow()
+            logger.error("task %s #%d failed permanently", claimed.name, claimed.id)
+        else:
+            claimed.status = "queued"
+            claimed.run_after = datetime.utcnow() + timedelta(seconds=min(2 ** claimed.attempts, MAX_BACKOFF))
+            logger.warning("task %s #%d failed, retry %d/%d", claimed.name, claimed.id, claimed.attempts, claimed.max_attempts)
+    else:
+        claimed.status = "done"
+        claimed.locked_until = None
+        claimed.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def work(app, poll_interval=DEFAULT_POLL_INTERVAL, burst=False):
+    """Run tasks until interrupted; with burst=True, stop once the queue is empty."""
+    with app.app_context():
+        # Connections inherited from the parent process must not be shared
+        db.engine.dispose()
+        while True:
+            claimed = claim_next()
+            if claimed is None:
+                if burst:
+                    return
+                time.sleep(poll_interval)
+                continue
+            run_task(claimed)
+            db.session.remove()
+
+
+def run_workers(app, processes=1, poll_interval=DEFAULT_POLL_INTERVAL, burst=False):
+    if processes <= 1:
+        return work(app, poll_interval, burst)
+    children = [Process(target=work, args=(app, poll_interval, burst), daemon=False) for _ in range(processes)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+
+
+# ----- TASK HANDLERS -----
+
+@task("send_email", max_attempts=8)
+def send_email(to, subject, body):
+    """Send through MAIL_SERVER when configured; otherwise log, which is enough for local runs."""
+    server = os.getenv("MAIL_SERVER")
+    if not server:
+        logger.info("MAIL_SERVER not set; email to %s: %s\n%s", to, subject, body)
+        return
+    message = EmailMessage()
+    message["From"] = os.getenv("MAIL_DEFAULT_SENDER", "no-reply@greenbizlink.com")
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(server, int(os.getenv("MAIL_PORT", 587)), timeout=30) as smtp:
+        if os.getenv("MAIL_USE_TLS", "1") == "1":
+            smtp.starttls()
+        if os.getenv("MAIL_USERNAME"):
+            smtp.login(os.getenv("MAIL_USERNAME"), os.getenv("MAIL_PASSWORD", ""))
+        smtp.send_message(message)
+
+
+@task("render_thumbnails", max_attempts=3)
+def render_thumbnails(source):
+    """Pre-render every thumbnail variant so the first page view doesn't pay for it."""
+    from api.thumbnails import get_thumbnails, local_media_path, render_derivative, SIZES, FORMATS
+
+    # source is the stored reference; resolve it exactly as the thumbnail routes do so the keys match
+    source = local_media_path(source)
+    if source is None:
+        return
+    thumbnails = get_thumbnails()
+    for size, edge in SIZES.items():
+        for fmt in FORMATS:
+            dest = thumbnails.path_for(thumbnails.key(source, size, fmt), fmt)
+            if not os.path.exists(dest):
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                render_derivative(source, dest, edge, fmt)
+
+
+@event.listens_for(User.profile_image, "set")
+@event.listens_for(Company.logo, "set")
+def _image_changed(target, value, oldvalue, initiator):
+    """Render derivatives of a new profile image or logo off the request path, whoever sets it."""
+    if value and value != oldvalue and "://" not in value and has_app_context():
+        enqueue("render_thumbnails", source=value)
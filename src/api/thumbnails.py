@@ -0,0 +1,167 @@
+"""
+Thumbnail/WebP derivatives for user images, profile images and company logos.
+
+A derivative is keyed by a hash of the source's path, mtime and size plus the
+variant, so a replaced source gets a new key. That makes every keyed URL safe
+to cache as immutable. Resolver routes redirect to /api/thumbnails/<key>.<ext>.
+
+Rendering happens once per key in a per-worker process pool, so Pillow's CPU
+work never holds the request thread's GIL. A request waits at most
+THUMBNAIL_WAIT seconds and otherwise falls back to the original while the
+render finishes. The cache directory is capped at THUMBNAIL_CACHE_MAX_BYTES;
+the least recently used files are evicted first.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import current_app
+from werkzeug.utils import safe_join
+
+SIZES = {"thumb": 128, "small": 320, "medium": 640}
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+DEFAULT_MAX_BYTES = 1024 ** 3
+DEFAULT_WAIT = 5.0
+
+
+def render_derivative(source, dest, edge, fmt):
+    """Runs in the pool process. Writes atomically so readers never see a partial file."""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((edge, edge))
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp = "%s.%d.tmp" % (dest, os.getpid())
+        options = {"quality": 80, "method": 4} if fmt == "webp" else {"quality": 82, "optimize": True, "progressive": True}
+        image.save(tmp, format=fmt.upper(), **options)
+    os.replace(tmp, dest)
+    return os.path.getsize(dest)
+
+
+class DerivativeCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, workers=None, wait=DEFAULT_WAIT):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._pending = {}
+        self._total = None
+
+    def key(self, source, size, fmt):
+        st = os.stat(source)
+        raw = "%s:%d:%d:%s:%s" % (os.path.realpath(source), st.st_mtime_ns, st.st_size, size, fmt)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def path_for(self, key, fmt):
+        return os.path.join(self.root, key[:2], key + "." + fmt)
+
+    def _executor(self):
+        # A pool inherited across gunicorn's fork is unusable; make one per worker
+        if self._pool_pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._pool_pid = os.getpid()
+            self._pending = {}
+        return self._pool
+
+    def get_or_render(self, source, size, fmt):
+        """Returns the derivative key once the file exists, or None if it isn't ready in time."""
+        key = self.key(source, size, fmt)
+        dest = self.path_for(key, fmt)
+        if os.path.exists(dest):
+            return key
+
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                future = self._executor().submit(render_derivative, source, dest, SIZES[size], fmt)
+                future.add_done_callback(lambda f, key=key: self._finished(key, f))
+                self._pending[key] = future
+        try:
+            future.result(timeout=self.wait)
+        except TimeoutError:
+            return None
+        except Exception as e:
+            current_app.logger.warning("thumbnail render failed for %s: %s", source, e)
+            return None
+        return key
+
+    def _finished(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+        if future.exception() is not None:
+            return
+        self._account(future.result())
+
+    def _scan(self):
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_atime, st.st_size, path))
+        return files
+
+    def _account(self, added):
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._scan())
+            else:
+                self._total += added
+            if self._total <= self.max_bytes:
+                return
+            # Evict least recently read files down to 90% of the cap
+            files = sorted(self._scan())
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+            self._total = total
+
+
+def setup_thumbnails(app):
+    app.config.setdefault("THUMBNAIL_CACHE_DIR", os.getenv(
+        "THUMBNAIL_CACHE_DIR", os.path.join(app.config.get("UPLOAD_FOLDER", "uploads"), ".derivatives")))
+    app.config.setdefault("THUMBNAIL_CACHE_MAX_BYTES", int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+    app.config.setdefault("THUMBNAIL_WORKERS", int(os.getenv("THUMBNAIL_WORKERS", 2)))
+    app.config.setdefault("THUMBNAIL_WAIT", float(os.getenv("THUMBNAIL_WAIT", DEFAULT_WAIT)))
+    app.extensions["thumbnails"] = DerivativeCache(
+        app.config["THUMBNAIL_CACHE_DIR"],
+        max_bytes=app.config["THUMBNAIL_CACHE_MAX_BYTES"],
+        workers=app.config["THUMBNAIL_WORKERS"],
+        wait=app.config["THUMBNAIL_WAIT"]
+    )
+
+
+def get_thumbnails():
+    return current_app.extensions["thumbnails"]
+
+
+def local_media_path(value):
+    """
+    Filesystem path for a stored image reference, or None for URLs, missing files
+    and anything outside UPLOAD_FOLDER. Users control these values, so absolute
+    paths and .. are refused rather than opened.
+    """
+    if not value or "://" in value:
+        return None
+    root = current_app.config["UPLOAD_FOLDER"]
+    prefix = root.rstrip("/") + "/"
+    # References may be stored with the upload folder prepended ("uploads/images/x.jpg")
+    path = safe_join(root, value[len(prefix):] if value.startswith(prefix) else value)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
@@ -0,0 +1,133 @@
+"""
+Resumable chunked uploads.
+
+Protocol:
+1. POST /uploads creates a session and returns {upload_id, offset: 0, chunk_size}.
+2. PUT /uploads/<id> appends one chunk. The raw body comes with an
+   Upload-Offset header (must equal the current offset) and X-Chunk-SHA256
+   (hex digest of the body).
+3. GET /uploads/<id> reports the offset to resume from after a dropped connection.
+4. POST /uploads/<id>/commit moves the finished file into place and creates
+   the UserMedia/JobApplication row.
+
+Chunks are streamed from the request socket into UPLOAD_FOLDER/.partial in
+small reads, so neither the worker's RAM nor a temp file ever holds the
+whole upload. A chunk whose digest doesn't match is cut back off the file.
+"""
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.utils import secure_filename
+from api.models import db, UploadSession
+from api.utils import APIException
+
+READ_SIZE = 64 * 1024
+CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+MAX_UPLOAD_SIZE = {"video": 2 * 1024 ** 3, "resume": 10 * 1024 ** 2}
+ALLOWED_EXTENSIONS = {"video": {"mp4", "mov", "avi"}, "resume": {"pdf", "doc", "docx"}}
+STALE_AFTER = timedelta(hours=24)
+
+
+def partial_path(session):
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], ".partial", session.id + ".part")
+
+
+def create_session(user_id, kind, file_name, total_size, job_id=None):
+    if kind not in ALLOWED_EXTENSIONS:
+        raise APIException("kind must be one of: " + ", ".join(ALLOWED_EXTENSIONS))
+    file_name = secure_filename(file_name or "")
+    if "." not in file_name or file_name.rsplit(".", 1)[1].lower() not in ALLOWED_EXTENSIONS[kind]:
+        raise APIException("File type not allowed")
+    if not isinstance(total_size, int) or not 0 < total_size <= MAX_UPLOAD_SIZE[kind]:
+        raise APIException("size must be between 1 and %d bytes" % MAX_UPLOAD_SIZE[kind])
+
+    session = UploadSession(id=uuid.uuid4().hex, user_id=user_id, kind=kind, file_name=file_name,
+                            total_size=total_size, job_id=job_id)
+    path = partial_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    db.session.add(session)
+    db.session.commit()
+    return session
+
+
+def append_chunk(session, offset, expected_sha256, stream, length):
+    """Write one chunk at offset, verifying its digest. Returns the new offset."""
+    if session.status != "open":
+        raise APIException("Upload already committed", status_code=409)
+    if offset != session.received:
+        raise APIException("Offset mismatch", status_code=409, payload={"offset": session.received})
+    if length is None or length <= 0 or length > MAX_CHUNK_SIZE:
+        raise APIException("Chunk must have a Content-Length of at most %d bytes" % MAX_CHUNK_SIZE, status_code=411)
+    if offset + length > session.total_size:
+        raise APIException("Chunk runs past the declared size", status_code=416)
+    if not expected_sha256:
+        raise APIException("X-Chunk-SHA256 header is required")
+
+    digest = hashlib.sha256()
+    written = 0
+    path = partial_path(session)
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        while written < length:
+            block = stream.read(min(READ_SIZE, length - written))
+            if not block:
+                break
+            f.write(block)
+            digest.update(block)
+            written += len(block)
+        if written != length or digest.hexdigest() != expected_sha256.lower():
+            # Incomplete or corrupted: drop what this chunk wrote so the client can resend it
+            f.truncate(offset)
+            raise APIException("Chunk incomplete or checksum mismatch", status_code=422,
+                               payload={"offset": session.received})
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Only advance if nobody else did meanwhile (two clients racing on one upload)
+    advanced = UploadSession.query.filter_by(id=session.id, received=offset).update(
+        {UploadSession.received: offset + length, UploadSession.updated_at: datetime.utcnow()},
+        synchronize_session=False)
+    db.session.commit()
+    if not advanced:
+        db.session.refresh(session)
+        raise APIException("Offset mismatch", status_code=409, payload={"offset": session.received})
+    db.session.refresh(session)
+    return session.received
+
+
+def finish_session(session, target_directory):
+    """Move the completed file into target_directory; returns its final path."""
+    if session.status != "open":
+        raise APIException("Upload already committed", status_code=409)
+    if session.received != session.total_size:
+        raise APIException("Upload incomplete", status_code=409, payload={"offset": session.received})
+
+    os.makedirs(target_directory, exist_ok=True)
+    final_path = os.path.join(target_directory, session.id[:8] + "_" + session.file_name)
+    os.replace(partial_path(session), final_path)
+    session.status = "committed"
+    return final_path
+
+
+def discard_session(session):
+    try:
+        os.remove(partial_path(session))
+    except FileNotFoundError:
+        pass
+    db.session.delete(session)
+    db.session.commit()
+
+
+def purge_stale_sessions():
+    """Delete open uploads untouched for STALE_AFTER and their partial files."""
+    stale = UploadSession.query.filter(
+        UploadSession.status == "open",
+        UploadSession.updated_at < datetime.utcnow() - STALE_AFTER
+    ).all()
+    for session in stale:
+        discard_session(session)
+    return len(stale)
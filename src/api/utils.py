@@ -1,4 +1,6 @@
+from contextlib import contextmanager
 from flask import jsonify, url_for
+from sqlalchemy import event
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +17,22 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+@contextmanager
+def count_queries(*engines):
+    """Collect every SQL statement the engines execute inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
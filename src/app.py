@@ -4,12 +4,24 @@ This module takes care of starting the API Server, Loading the DB and Adding the
 import os
 from flask import Flask, request, jsonify, url_for, send_from_directory
 from flask_migrate import Migrate
+from flask_jwt_extended import JWTManager
 from flask_swagger import swagger
 from api.utils import APIException, generate_sitemap
 from api.models import db
 from api.routes import api
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.cache import setup_cache
+from api.adstats import setup_ad_stats
+from api.revocation import setup_revocation
+from api.thumbnails import setup_thumbnails
+from api.metrics import setup_metrics
+from api.profiling import setup_profiling
+from api.dbpool import engine_options, setup_pool_metrics
+from api.replicas import setup_replicas
+from api.events import setup_events
+from api.httpcache import setup_http_cache, static_cache_headers
+from api.fastjson import setup_json
 
 # from models import Person
 
@@ -28,15 +40,55 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# pool size/overflow/recycle/pre-ping from DB_* env vars (see api/dbpool.py)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", os.getenv("FLASK_APP_KEY"))
+app.config['UPLOAD_FOLDER'] = os.getenv("UPLOAD_FOLDER", "uploads")
+# e.g. /protected-media: nginx serves media under this internal location via X-Accel-Redirect
+app.config['MEDIA_ACCEL_PREFIX'] = os.getenv("MEDIA_ACCEL_PREFIX")
 MIGRATE = Migrate(app, db, compare_type=True)
 db.init_app(app)
 
+# optional read replicas (DATABASE_REPLICA_URLS) for routes marked @use_replica
+setup_replicas(app)
+
+# JWT auth, with revoked tokens checked against an in-process bloom filter
+jwt = JWTManager(app)
+setup_revocation(app, jwt)
+
 # add the admin
 setup_admin(app)
 
 # add the admin
 setup_commands(app)
 
+# read-through cache (in-process LRU, or Redis when CACHE_URL is set)
+setup_cache(app)
+
+# buffered ad impression/click counters
+setup_ad_stats(app)
+
+# image thumbnails rendered in a process pool, cached on disk
+setup_thumbnails(app)
+
+# per-user event push (SSE) for connection requests
+setup_events(app)
+
+# Prometheus request metrics, served at /metrics
+setup_metrics(app)
+
+# per-request SQL counts/timings and slow request log
+setup_profiling(app)
+
+# connection pool gauges, 503 instead of 500 when the pool is exhausted
+setup_pool_metrics(app, db)
+
+# orjson-backed jsonify when orjson is installed
+setup_json(app)
+
+# ETags and 304s for JSON reads
+setup_http_cache(app)
+
 # Add all endpoints form the API with a "api" prefix
 app.register_blueprint(api, url_prefix='/api')
 
@@ -54,7 +106,7 @@ def handle_invalid_usage(error):
 def sitemap():
     if ENV == "development":
         return generate_sitemap(app)
-    return send_from_directory(static_file_dir, 'index.html')
+    return static_cache_headers(send_from_directory(static_file_dir, 'index.html'), 'index.html')
 
 # any other endpoint will try to serve it like a static file
 @app.route('/<path:path>', methods=['GET'])
@@ -62,8 +114,8 @@ def serve_any_other_file(path):
     if not os.path.isfile(os.path.join(static_file_dir, path)):
         path = 'index.html'
     response = send_from_directory(static_file_dir, path)
-    response.cache_control.max_age = 0  # avoid cache memory
-    return response
+    # hashed bundles are cached for good, everything else (index.html) is revalidated
+    return static_cache_headers(response, path)
 
 
 # this only runs if `$ python src/main.py` is executed
@@ -0,0 +1,8 @@
+# ASGI entry point, the async alternative to wsgi.py:
+#   uvicorn asgi:application --app-dir src/ --workers 2
+# Hot read endpoints run natively async; everything else goes to the Flask app (see api/asyncapi.py).
+
+from app import app
+from api.asyncapi import create_asgi_app
+
+application = create_asgi_app(app)
@@ -14,7 +14,7 @@ const Notifications = () => {
         if (response.error) {
             console.error(response.error);
         } else {
-            setNotifications(response);
+            setNotifications(response.notifications);
         }
     };
 
@@ -25,7 +25,7 @@ const Notifications = () => {
                 notifications.map((notification, index) => (
                     <div key={index}>
                         <p>{notification.message}</p>
-                        <small>{new Date(notification.timestamp).toLocaleString()}</small>
+                        <small>{new Date(notification.created_at).toLocaleString()}</small>
                     </div>
                 ))
             }
@@ -0,0 +1,18 @@
+# Read by gunicorn from --chdir (./src/). Keeps prometheus_client's multiprocess
+# metrics (api/metrics.py) correct when PROMETHEUS_MULTIPROC_DIR is set.
+import os
+import shutil
+
+
+def on_starting(server):
+    # Files left over from a previous run would be summed into this one
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
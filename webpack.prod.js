@@ -4,6 +4,8 @@ const Dotenv = require('dotenv-webpack');
 module.exports = merge(common, {
     mode: 'production',
     output: {
+        // content-hashed names are served with immutable caching (src/api/httpcache.py)
+        filename: '[name].[contenthash].js',
         publicPath: '/'
     },
     plugins: [